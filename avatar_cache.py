@@ -0,0 +1,129 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Constants
+AVATAR_TIMEOUT = (3, 10)  # (kết nối, đọc) tính bằng giây
+AVATAR_MAX_BYTES = 5 * 1024 * 1024  # Bỏ qua ảnh lớn hơn mức này
+AVATAR_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ImageCache:
+    """LRU nội dung ảnh giới hạn theo byte, kèm thư mục tạm riêng để ghi ảnh ra file trước khi gửi."""
+
+    def __init__(self, max_bytes, staging_prefix='zalo-image-'):
+        self.max_bytes = max_bytes
+        self.staging_prefix = staging_prefix
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._staging_dir = None
+
+    def peek(self, key):
+        """Nội dung đã lưu theo key, None nếu chưa có."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        """Thêm ảnh vào cache, loại bỏ ảnh cũ nhất khi vượt giới hạn byte."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _get_staging_dir(self):
+        """Thư mục tạm riêng của tiến trình để chứa ảnh trước khi gửi."""
+        with self._lock:
+            if self._staging_dir is None:
+                self._staging_dir = tempfile.mkdtemp(prefix=self.staging_prefix)
+                atexit.register(shutil.rmtree, self._staging_dir, True)
+            return self._staging_dir
+
+    @contextmanager
+    def staged_data(self, data):
+        """Ghi data ra một file tạm có tên duy nhất, xóa file khi ra khỏi khối with.
+
+        Trả về None nếu data là None.
+        """
+        if data is None:
+            yield None
+            return
+        fd, path = tempfile.mkstemp(suffix='.jpg', dir=self._get_staging_dir())
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class AvatarCache(ImageCache):
+    """Tải ảnh đại diện qua session giữ kết nối, lưu bản gần nhất trong LRU giới hạn theo byte."""
+
+    def __init__(self, max_bytes=AVATAR_CACHE_BYTES, timeout=AVATAR_TIMEOUT, pool_size=16):
+        super().__init__(max_bytes, staging_prefix='zalo-avatar-')
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def get(self, url):
+        """Lấy nội dung ảnh theo URL, chỉ tải khi chưa có trong cache. Trả về None nếu lỗi."""
+        if not url:
+            return None
+        data = self.peek(url)
+        if data is not None:
+            return data
+
+        data = self._download(url)
+        if data is not None:
+            self.put(url, data)
+        return data
+
+    def _download(self, url):
+        """Tải ảnh với timeout chặt, từ chối ảnh quá lớn."""
+        try:
+            with self._session.get(url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    return None
+                chunks, size = [], 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > AVATAR_MAX_BYTES:
+                        return None
+                    chunks.append(chunk)
+                return b''.join(chunks)
+        except requests.RequestException as e:
+            print(f"Lỗi khi tải ảnh đại diện: {e}")
+            return None
+
+    def staged(self, url, download=True):
+        """Ghi ảnh ra một file tạm có tên duy nhất, xóa file khi ra khỏi khối with.
+
+        download=False chỉ dùng ảnh đã có trong cache. Trả về None nếu không có ảnh.
+        """
+        return self.staged_data(self.get(url) if download else self.peek(url))
+
+
+avatar_cache = AvatarCache()
@@ -0,0 +1,124 @@
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from bot_log import get_logger, log_event
+
+# Constants
+BATCH_MAX_SIZE = 8  # Số tin nhắn tối đa trong một lần gọi
+BATCH_MAX_WAIT = 0.3  # Số giây tối đa chờ gom đủ lô
+
+moderation_log = get_logger('moderation')
+
+_JSON_ARRAY = re.compile(r'\[.*?\]', re.S)
+_VERDICTS = {'yes': True, 'có': True, 'true': True, '1': True, 'no': False, 'không': False, 'false': False, '0': False}
+
+
+def parse_verdicts(text, count):
+    """Đọc mảng JSON yes/no từ câu trả lời, trả về list count phần tử (None nếu không đọc được).
+
+    Mảng khác đúng count phần tử thì không biết phần tử nào ứng với tin nào: bỏ cả lô (toàn None)
+    để mọi tin được hỏi lại từng tin, thay vì áp theo vị trí rồi xóa nhầm tin vô hại.
+    """
+    verdicts = [None] * count
+    match = _JSON_ARRAY.search(text or '')
+    if not match:
+        return verdicts
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return verdicts
+    if not isinstance(items, list) or len(items) != count:
+        return verdicts
+    return [_VERDICTS.get(str(item).strip().lower()) for item in items]
+
+
+class BatchClassifier:
+    """Gom các tin nhắn nghi ngờ trong tối đa max_size tin hoặc max_wait giây rồi phân loại trong một lần gọi.
+
+    classify_batch(messages, timeout) trả về list kết quả (True/False/None) theo thứ tự;
+    các phần tử None, hoặc cả lô khi lỗi, được gọi lại từng tin bằng classify_one(message, timeout).
+    classify_one trả về None khi không có kết quả (lỗi API...).
+    """
+
+    def __init__(self, classify_batch, classify_one, max_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT):
+        self.classify_batch = classify_batch
+        self.classify_one = classify_one
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.fallbacks = 0
+        thread = threading.Thread(target=self._batch_loop, name='batch-classifier', daemon=True)
+        thread.start()
+
+    def classify(self, message, timeout=None):
+        """Phân loại một tin nhắn, chờ kết quả của lô chứa nó. Trả về None nếu quá hạn hoặc lỗi (chưa có kết quả)."""
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout else None
+        self._queue.put((message, deadline, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Lô chưa chạy thì tin bị bỏ khỏi lô, không tốn lượt gọi GPT cho kết quả không còn ai chờ
+            future.cancel()
+            # Người gọi ghi nhận kết quả hết hạn (selling_timeout), ở đây chỉ ghi khi bật DEBUG
+            log_event(moderation_log, 'batch_classify_timeout', logging.DEBUG, timeout=timeout)
+            return None
+        except Exception as e:
+            log_event(moderation_log, 'batch_classify_failed', logging.WARNING, error=str(e))
+            return None
+
+    def _collect(self):
+        """Chờ tin đầu tiên rồi gom thêm cho tới khi đủ lô hoặc hết max_wait."""
+        batch = [self._queue.get()]
+        flush_at = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            remaining = flush_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        """Luồng gom lô: mỗi lô được xử lý trong một luồng riêng để lô sau không phải chờ."""
+        while True:
+            batch = self._collect()
+            threading.Thread(target=self._run_batch, args=(batch,), daemon=True).start()
+
+    def _run_batch(self, batch):
+        """Gọi classify_batch cho cả lô, gọi lại từng tin cho phần trả lời thiếu hoặc sai định dạng."""
+        now = time.monotonic()
+        # Bỏ các tin đã bị huỷ do quá hạn; các tin còn lại chuyển sang trạng thái đang chạy, không huỷ được nữa
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        deadlines = [deadline for _, deadline, _ in batch if deadline]
+        timeout = max(0.1, min(deadlines) - now) if deadlines else None
+        messages = [message for message, _, _ in batch]
+
+        verdicts = [None] * len(batch)
+        if len(batch) > 1:
+            self.batches += 1
+            try:
+                verdicts = (list(self.classify_batch(messages, timeout=timeout)) + verdicts)[:len(batch)]
+            except Exception as e:
+                log_event(moderation_log, 'gpt_batch_failed', logging.WARNING, size=len(batch), error=str(e))
+            self.fallbacks += verdicts.count(None)
+
+        for (message, deadline, future), verdict in zip(batch, verdicts):
+            if verdict is None:
+                remaining = max(0.1, deadline - time.monotonic()) if deadline else None
+                try:
+                    verdict = self.classify_one(message, timeout=remaining)
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+            future.set_result(None if verdict is None else bool(verdict))
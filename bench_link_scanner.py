@@ -0,0 +1,60 @@
+"""Đo tốc độ LinkScanner so với regex cũ trong onMessage.
+
+Chạy: python bench_link_scanner.py
+"""
+import re
+import time
+
+from link_scanner import LinkScanner
+
+LEGACY_PATTERN = r'(https?:\/\/[^\s]+|www\.[^\s]+|(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,})'
+
+# Tin nhắn có kích thước như thực tế, kèm vài trường hợp xấu nhất cho regex cũ
+MESSAGES = {
+    'ngắn': 'ok anh em, tối nay 8h họp nhóm nha',
+    'dài': 'Chào cả nhà, hôm nay mình chia sẻ kinh nghiệm nấu phở bò. ' * 40,
+    'liên kết': 'Mọi người xem thêm tại https://example.com/bai-viet?id=123 nhé',
+    'tên miền': 'Inbox hoặc ghé Shopee.VN tìm shop mình nha cả nhà',
+    'số thập phân': 'Giá vàng hôm nay 7.85 triệu, tăng 0.15 so với hôm qua ' * 20,
+    'nhiều dấu chấm': 'a.' * 2000,
+    'nhãn dài': ('x' * 50 + '.') * 200 + '1',
+    'tiêu đề + văn bản': ('Tin tức hôm nay', 'Đọc tại www.tintuc.vn/abc'),
+}
+
+
+def legacy_scan(title, text):
+    """Cách kiểm tra cũ: biên dịch lại pattern, lower() và search từng trường."""
+    link_pattern = LEGACY_PATTERN
+    if isinstance(title, str) and re.search(link_pattern, title.strip().lower()):
+        return True
+    return isinstance(text, str) and bool(re.search(link_pattern, text.strip().lower()))
+
+
+def run(name, func, title, text, min_time=0.3):
+    """Chạy func cho tới khi đủ min_time giây, trả về (tin nhắn/giây, độ trễ lớn nhất)."""
+    count, worst = 0, 0.0
+    started = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        func(title, text)
+        elapsed = time.perf_counter() - t0
+        worst = max(worst, elapsed)
+        count += 1
+        total = time.perf_counter() - started
+        if total >= min_time and count >= 3:
+            return count / total, worst
+
+
+def main():
+    scanner = LinkScanner()
+    print(f"{'Tin nhắn':<20}{'cũ (msg/s)':>14}{'cũ max (ms)':>14}{'mới (msg/s)':>14}{'mới max (ms)':>14}")
+    for name, message in MESSAGES.items():
+        title, text = message if isinstance(message, tuple) else (None, message)
+        assert legacy_scan(title, text) == scanner.has_link(title, text) or name in ('nhiều dấu chấm', 'nhãn dài')
+        old_rate, old_worst = run(name, legacy_scan, title, text)
+        new_rate, new_worst = run(name, scanner.has_link, title, text)
+        print(f"{name:<20}{old_rate:>14,.0f}{old_worst * 1000:>14.3f}{new_rate:>14,.0f}{new_worst * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
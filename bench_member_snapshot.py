@@ -0,0 +1,86 @@
+"""So sánh bộ nhớ và thời gian so sánh thành viên: cache memVerList gốc và MemberSnapshot.
+
+Chạy: python bench_member_snapshot.py [số nhóm] [số thành viên mỗi nhóm]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from member_snapshot import MemberSnapshot
+
+
+def make_group(members):
+    """memVerList giả lập với memberId 19 chữ số như Zalo."""
+    return [f"{random.randrange(10 ** 18, 10 ** 19)}_{random.randrange(10)}" for _ in range(members)]
+
+
+def churn(mem_ver_list, changes):
+    """Bản sao memVerList (chuỗi mới như khi vừa parse JSON) với vài người ra/vào."""
+    copied = [''.join(member) for member in mem_ver_list[changes:]]
+    return copied + make_group(changes)
+
+
+def legacy_diff(cached, current):
+    """Cách so sánh cũ trong check_member_changes."""
+    old_members = {member.split('_')[0] for member in cached}
+    new_members = {member.split('_')[0] for member in current}
+    return new_members - old_members, old_members - new_members
+
+
+def measure_memory(build):
+    """Bộ nhớ (byte) mà build() giữ lại."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def measure_polls(groups, polls, diff):
+    """Thời gian trung bình (ms) cho một lượt so sánh mọi nhóm."""
+    started = time.perf_counter()
+    for current in polls:
+        for thread_id, mem_ver_list in current.items():
+            diff(thread_id, mem_ver_list)
+    return (time.perf_counter() - started) / len(polls) * 1000
+
+
+def main():
+    group_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    member_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    random.seed(1)
+    groups = {str(i): make_group(member_count) for i in range(group_count)}
+
+    legacy_bytes = measure_memory(lambda: {t: {'member_list': churn(m, 0)} for t, m in groups.items()})
+    snapshot_bytes = measure_memory(lambda: {t: {'members': MemberSnapshot.parse(m)} for t, m in groups.items()})
+
+    # Mỗi lượt: đa số nhóm không đổi, 5% nhóm có 2 người ra/vào; danh sách luôn là chuỗi mới từ API
+    polls = []
+    for _ in range(5):
+        polls.append({t: churn(m, 2 if random.random() < 0.05 else 0) for t, m in groups.items()})
+
+    legacy_cache = {t: list(m) for t, m in groups.items()}
+
+    def legacy(thread_id, current):
+        legacy_diff(legacy_cache[thread_id], current)
+        legacy_cache[thread_id] = current
+
+    snapshots = {t: MemberSnapshot.parse(m) for t, m in groups.items()}
+
+    def compact(thread_id, current):
+        snapshots[thread_id] = snapshots[thread_id].diff(current)[2]
+
+    legacy_ms = measure_polls(groups, polls, legacy)
+    compact_ms = measure_polls(groups, polls, compact)
+
+    print(f"{group_count} nhóm x {member_count} thành viên")
+    print(f"{'':<18}{'bộ nhớ (MB)':>14}{'mỗi lượt (ms)':>16}")
+    print(f"{'memVerList gốc':<18}{legacy_bytes / 2 ** 20:>14.1f}{legacy_ms:>16.1f}")
+    print(f"{'MemberSnapshot':<18}{snapshot_bytes / 2 ** 20:>14.1f}{compact_ms:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
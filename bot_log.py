@@ -0,0 +1,124 @@
+"""Ghi log có cấu trúc (JSON lines) qua hàng đợi nền để luồng listener không phải chờ ghi stdout/file.
+
+Luồng gọi log_event chỉ đưa bản ghi chưa định dạng vào hàng đợi; việc định dạng, repr các trường và ghi
+ra console/file diễn ra ở luồng ghi log của QueueListener.
+
+    from bot_log import setup_logging, get_logger, log_event
+    setup_logging('bot.log', sampling={'message': 0.05})
+    log = get_logger('moderation')
+    log_event(log, 'link_deleted', thread_id=thread_id, author_id=author_id, link=link)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+
+# Constants
+LOG_FILE = 'bot.log'
+LOG_LEVEL = 'INFO'
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Xoay file khi vượt 10 MB
+LOG_BACKUPS = 5
+LOG_QUEUE_SIZE = 10000  # Hàng đợi đầy thì bỏ bản ghi thay vì chặn listener
+LOG_ROOT = 'bot'
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi bản ghi là một dòng JSON: ts, level, category, event và các trường kèm theo."""
+
+    def format(self, record):
+        row = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'category': record.name.split('.', 1)[-1],
+            'event': record.getMessage()
+        }
+        row.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            row['exc'] = self.formatException(record.exc_info)
+        # Đối tượng không phải JSON (ví dụ message_object) chỉ được repr ở luồng ghi log
+        return json.dumps(row, ensure_ascii=False, default=repr)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Dạng một dòng dễ đọc cho console: giờ, mức, nhóm log, sự kiện và các trường key=value."""
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        extra = ' '.join(f'{key}={value}' for key, value in fields.items())
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname[0]} " \
+               f"{record.name.split('.', 1)[-1]} {record.getMessage()} {extra}".rstrip()
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Chỉ giữ một tỉ lệ bản ghi dưới mức WARNING theo từng nhóm log, ví dụ {'message': 0.05}."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name.split('.', 1)[-1])
+        return rate is None or random.random() < rate
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler không định dạng sẵn bản ghi: việc format và repr diễn ra ở luồng ghi log."""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging(path=LOG_FILE, level=LOG_LEVEL, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                  console=True, sampling=None):
+    """Cấu hình logger gốc 'bot': ghi JSON lines ra file xoay vòng (và console) qua một luồng nền."""
+    global _listener
+    if _listener is not None:
+        return
+    handlers = []
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = _LazyQueueHandler(records)
+    queue_handler.addFilter(SamplingFilter(sampling))
+    root = logging.getLogger(LOG_ROOT)
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(category):
+    """Logger của một nhóm log, ví dụ 'message', 'moderation', 'welcome'."""
+    return logging.getLogger(f'{LOG_ROOT}.{category}')
+
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """Ghi một sự kiện có cấu trúc; không tạo bản ghi nếu mức log đang tắt."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
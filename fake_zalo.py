@@ -0,0 +1,184 @@
+"""ZaloAPI giả lập chạy trong tiến trình để chạy lại luồng tin nhắn và đo hiệu năng không cần cookie thật.
+
+    world = FakeWorld(groups=50, members=500, latency={'fetchGroupInfo': 0.05})
+    install(world)           # thay module zlapi trước khi import New.py/update.py
+    bot_module = load_script('update.py')
+"""
+import enum
+import importlib.util
+import itertools
+import random
+import sys
+import threading
+import time
+import types
+from collections import Counter
+
+# Constants
+DEFAULT_LATENCY = {
+    'fetchAllGroups': 0.02,
+    'fetchGroupInfo': 0.03,
+    'fetchUserInfo': 0.03,
+    'deleteGroupMsg': 0.02,
+    'send': 0.02,
+    'replyMessage': 0.02,
+    'sendLocalImage': 0.05
+}
+FAKE_UID = '100000000000000001'
+
+
+class FakeWorld:
+    """Trạng thái phía "máy chủ Zalo": nhóm, thành viên, phiên bản gridVerMap, độ trễ và số lần gọi API."""
+
+    def __init__(self, groups=10, members=100, latency=None, seed=1):
+        self.latency = dict(DEFAULT_LATENCY if latency is None else latency)
+        self.calls = Counter()
+        self.sent = []  # (api, thread_id, text)
+        self.deleted = []  # (thread_id, msg_id)
+        self.groups = {}
+        self._ids = itertools.count(10 ** 18 + 1)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        for i in range(groups):
+            self.add_group(f'{9 * 10 ** 17 + i}', f'Nhóm {i}', members)
+
+    def add_group(self, thread_id, name, members):
+        """Thêm nhóm với số thành viên cho trước."""
+        with self._lock:
+            self.groups[thread_id] = {
+                'name': name,
+                'members': {str(next(self._ids)): 0 for _ in range(members)},
+                'version': 1
+            }
+
+    def join(self, thread_id, count=1):
+        """count người vào nhóm, trả về danh sách memberId mới."""
+        with self._lock:
+            group = self.groups[thread_id]
+            joined = [str(next(self._ids)) for _ in range(count)]
+            group['members'].update((member_id, 0) for member_id in joined)
+            group['version'] += 1
+            return joined
+
+    def leave(self, thread_id, count=1):
+        """count người rời nhóm, trả về danh sách memberId đã rời."""
+        with self._lock:
+            group = self.groups[thread_id]
+            left = self._random.sample(sorted(group['members']), min(count, len(group['members'])))
+            for member_id in left:
+                del group['members'][member_id]
+            group['version'] += 1
+            return left
+
+    def call(self, api):
+        """Ghi nhận một lần gọi API và chờ độ trễ giả lập."""
+        with self._lock:
+            self.calls[api] += 1
+        delay = self.latency.get(api, 0)
+        if delay:
+            time.sleep(delay)
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+
+_world = None
+
+
+class FakeZaloAPI:
+    """Thay cho zlapi.ZaloAPI: cùng tên và cách trả về của các hàm mà bot dùng, dữ liệu lấy từ FakeWorld."""
+
+    def __init__(self, api_key=None, secret_key=None, imei=None, session_cookies=None, *args, **kwargs):
+        if _world is None:
+            raise RuntimeError("Chưa gọi fake_zalo.install(world)")
+        self.world = _world
+        self.uid = FAKE_UID
+
+    def fetchAllGroups(self):
+        self.world.call('fetchAllGroups')
+        with self.world._lock:
+            ver_map = {thread_id: str(group['version']) for thread_id, group in self.world.groups.items()}
+        return types.SimpleNamespace(gridVerMap=ver_map)
+
+    def fetchGroupInfo(self, groupId):
+        self.world.call('fetchGroupInfo')
+        with self.world._lock:
+            group = self.world.groups.get(groupId)
+            if group is None:
+                return types.SimpleNamespace(gridInfoMap={})
+            info = {
+                'name': group['name'],
+                'memVerList': [f'{member_id}_{version}' for member_id, version in group['members'].items()],
+                'totalMember': len(group['members'])
+            }
+        return types.SimpleNamespace(gridInfoMap={groupId: info})
+
+    def fetchUserInfo(self, userId):
+        self.world.call('fetchUserInfo')
+        user_ids = userId if isinstance(userId, (list, tuple)) else [userId]
+        profiles = {str(user_id): {'displayName': f'User {str(user_id)[-4:]}', 'avatar': None} for user_id in user_ids}
+        return types.SimpleNamespace(changed_profiles=profiles)
+
+    def send(self, message, thread_id, thread_type=None, *args, **kwargs):
+        self.world.call('send')
+        self.world.sent.append(('send', thread_id, getattr(message, 'text', message)))
+
+    def replyMessage(self, message, replyMsg, thread_id, thread_type=None, *args, **kwargs):
+        self.world.call('replyMessage')
+        self.world.sent.append(('replyMessage', thread_id, getattr(message, 'text', message)))
+
+    def sendLocalImage(self, imagePath, thread_id, thread_type=None, width=2560, height=2560, message=None, *args, **kwargs):
+        self.world.call('sendLocalImage')
+        self.world.sent.append(('sendLocalImage', thread_id, getattr(message, 'text', message)))
+
+    def deleteGroupMsg(self, msgId, ownerId, clientMsgId, groupId):
+        self.world.call('deleteGroupMsg')
+        self.world.deleted.append((groupId, msgId))
+
+    def listen(self, *args, **kwargs):
+        """Không kết nối websocket; tin nhắn được đưa vào bằng replay.py."""
+
+
+def _fake_models():
+    """Message và ThreadType tối thiểu khi không cài zlapi."""
+    models = types.ModuleType('zlapi.models')
+
+    class ThreadType(enum.Enum):
+        USER = 0
+        GROUP = 1
+
+    class Message:
+        def __init__(self, text=None, mention=None, style=None, parse_mode=None):
+            self.text = text
+            self.mention = mention
+            self.style = style
+
+    models.ThreadType = ThreadType
+    models.Message = Message
+    return models
+
+
+def install(world):
+    """Đăng ký module zlapi giả (ZaloAPI = FakeZaloAPI), dùng zlapi.models thật nếu đã cài."""
+    global _world
+    _world = world
+    try:
+        from zlapi import models
+    except ImportError:
+        models = _fake_models()
+    module = types.ModuleType('zlapi')
+    module.ZaloAPI = FakeZaloAPI
+    module.models = models
+    sys.modules['zlapi'] = module
+    sys.modules['zlapi.models'] = models
+    return module
+
+
+def load_script(path, name='bot_under_test'):
+    """Import New.py/update.py như một module (không chạy phần if __name__ == '__main__')."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
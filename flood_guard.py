@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Constants
+FLOOD_MAX_MESSAGES = 8  # Quá 8 tin trong cửa sổ là spam
+FLOOD_WINDOW = 10  # Cửa sổ trượt (giây)
+FLOOD_MUTE = 60  # Số giây tiếp tục xóa tin của người spam sau khi phát hiện
+FLOOD_MAX_AUTHORS = 20000  # Số người gửi tối đa được theo dõi cùng lúc
+
+
+class _AuthorState:
+    """Bộ đếm cửa sổ trượt xấp xỉ (cửa sổ trước + cửa sổ hiện tại) và các tin gần nhất của một người."""
+
+    __slots__ = ('window_start', 'current', 'previous', 'recent', 'muted_until', 'last_seen')
+
+    def __init__(self, now, max_messages):
+        self.window_start = now
+        self.current = 0
+        self.previous = 0
+        self.recent = deque(maxlen=max_messages)
+        self.muted_until = 0.0
+        self.last_seen = now
+
+
+class FloodGuard:
+    """Phát hiện người gửi dồn dập theo từng (nhóm, người gửi), đọc ngưỡng từ mục 'flood' trong bảng settings của bot.db.
+
+    Cấu hình dạng {"flood": {"<thread_id>" | "default": {"max_messages": 8, "window": 10, "mute": 60}}}, khóa thiếu
+    dùng hằng số mặc định ({} là bật với ngưỡng mặc định). Chỉ bật với nhóm có mục riêng hoặc khi có mục "default";
+    max_messages = 0 để tắt với một nhóm.
+    """
+
+    def __init__(self, store, section='flood', max_authors=FLOOD_MAX_AUTHORS):
+        self.store = store
+        self.section = section
+        self.max_authors = max_authors
+        self._authors = OrderedDict()  # (thread_id, author_id) -> _AuthorState, cũ nhất ở đầu
+        self._config_cache = {}  # thread_id -> (phiên bản cấu hình, ngưỡng)
+        self._lock = threading.Lock()
+        self.flagged = 0
+
+    def _config(self, thread_id):
+        """Lấy (max_messages, window, mute) của nhóm, rơi về 'default'; không có mục nào thì max_messages là 0 (tắt)."""
+        version = self.store.current_version()
+        cached = self._config_cache.get(thread_id)
+        if cached and cached[0] == version:
+            return cached[1]
+        config = self.store.get(self.section, thread_id)
+        if config is None:
+            config = self.store.get(self.section, 'default')
+        limits = (
+            int(config.get('max_messages', FLOOD_MAX_MESSAGES)) if config is not None else 0,
+            float((config or {}).get('window', FLOOD_WINDOW)),
+            float((config or {}).get('mute', FLOOD_MUTE))
+        )
+        self._config_cache[thread_id] = (version, limits)
+        return limits
+
+    def record(self, thread_id, author_id, message_ref):
+        """Ghi nhận một tin nhắn, trả về danh sách tin cần xóa (rỗng nếu người gửi không spam).
+
+        Lần đầu vượt ngưỡng trả về các tin gần nhất của người đó; trong thời gian bị chặn trả về chính tin vừa gửi.
+        """
+        max_messages, window, mute = self._config(thread_id)
+        if max_messages <= 0:
+            return []
+        now = time.monotonic()
+        key = (thread_id, author_id)
+        with self._lock:
+            state = self._authors.get(key)
+            if state is None:
+                state = self._authors[key] = _AuthorState(now, max_messages + 1)
+            else:
+                self._authors.move_to_end(key)
+            state.last_seen = now
+            self._evict(now, window + mute)
+
+            if now < state.muted_until:
+                return [message_ref]
+
+            # Dời cửa sổ: cửa sổ hiện tại trở thành cửa sổ trước, hoặc bỏ cả hai nếu đã quá lâu
+            elapsed = now - state.window_start
+            if elapsed >= 2 * window:
+                state.previous, state.current, state.window_start = 0, 0, now
+            elif elapsed >= window:
+                state.previous, state.current = state.current, 0
+                state.window_start += window
+            state.current += 1
+            state.recent.append(message_ref)
+
+            weight = 1 - (now - state.window_start) / window
+            if state.previous * weight + state.current <= max_messages:
+                return []
+            state.muted_until = now + mute
+            self.flagged += 1
+            refs = list(state.recent)
+            state.recent.clear()
+            return refs
+
+    def _evict(self, now, idle):
+        """Bỏ người gửi không hoạt động quá idle giây hoặc vượt số lượng tối đa (cần giữ khóa)."""
+        while self._authors:
+            key, state = next(iter(self._authors.items()))
+            if len(self._authors) <= self.max_authors and now - state.last_seen < idle:
+                break
+            del self._authors[key]
@@ -0,0 +1,145 @@
+import re
+import threading
+import unicodedata
+from collections import deque
+
+# Ký tự phân cách giữa các chữ cái đơn lẻ bị gộp lại: "b.á.n", "b á n" -> "bán"
+_SPLIT_LETTERS = re.compile(r'(?<=\b\w)[\W_]+(?=\w\b)')
+_WHITESPACE = re.compile(r'\s+')
+# Ký tự định dạng vô hình (zero-width...) thường dùng để né bộ lọc
+_INVISIBLE = dict.fromkeys(i for i in range(0x2000, 0x2070) if unicodedata.category(chr(i)) == 'Cf')
+_INVISIBLE[0xFEFF] = None
+
+
+def normalize(text, strip_tones=False, collapse_separators=True):
+    """Chuẩn hóa tin nhắn tiếng Việt trước khi dò từ khóa.
+
+    NFKC đưa ký tự full-width về dạng thường và dựng lại dấu (NFD -> NFC),
+    strip_tones bỏ toàn bộ dấu thanh/dấu mũ ("giá" -> "gia"),
+    collapse_separators gộp các chữ cái bị tách bởi dấu chấm/khoảng trắng.
+    Mọi chuỗi khoảng trắng được gộp thành một dấu cách: "tuyển  ctv" -> "tuyển ctv".
+    """
+    text = unicodedata.normalize('NFKC', text).translate(_INVISIBLE).lower()
+    if strip_tones:
+        text = ''.join(ch for ch in unicodedata.normalize('NFD', text) if not unicodedata.combining(ch))
+        text = text.replace('đ', 'd')
+    text = _WHITESPACE.sub(' ', text)
+    if collapse_separators:
+        text = _SPLIT_LETTERS.sub('', text)
+    return text
+
+
+class AhoCorasick:
+    """Automaton Aho-Corasick dựng sẵn thành bảng chuyển trạng thái, dò mọi từ khóa trong một lượt."""
+
+    def __init__(self, keywords):
+        self._delta = [{}]  # trạng thái -> {ký tự: trạng thái kế tiếp}
+        self._output = [None]  # trạng thái -> từ khóa kết thúc tại đó (ngắn nhất)
+        fail = [0]
+
+        for keyword, value in keywords:
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = self._delta[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._delta)
+                    self._delta[state][ch] = nxt
+                    self._delta.append({})
+                    self._output.append(None)
+                    fail.append(0)
+                state = nxt
+            if self._output[state] is None:
+                self._output[state] = value
+
+        # Dựng fail link theo BFS (nông trước sâu sau) rồi gộp vào bảng chuyển,
+        # để khi dò chỉ cần một phép tra dict cho mỗi ký tự
+        queue = deque(self._delta[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = self._delta[fail[state]]
+            for ch, nxt in self._delta[state].items():
+                fail[nxt] = fallback.get(ch, 0)
+                if self._output[nxt] is None:
+                    self._output[nxt] = self._output[fail[nxt]]
+                queue.append(nxt)
+            for ch, nxt in fallback.items():
+                self._delta[state].setdefault(ch, nxt)
+
+    def search(self, text):
+        """Trả về giá trị của từ khóa đầu tiên tìm thấy trong text, None nếu không có."""
+        delta, output = self._delta, self._output
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+class KeywordFilter:
+    """Bộ lọc từ khóa theo nhóm, đọc từ mục 'keywords' trong bảng settings của bot.db.
+
+    Cấu hình dạng {"keywords": {"<thread_id>" | "default": {"words": [...],
+    "strip_tones": false, "collapse_separators": true}}}. Automaton được dựng lại
+    khi cấu hình thay đổi, không cần khởi động lại listener.
+
+    Từ khóa nhiều chữ còn được dò trên tin nhắn đã bỏ hết dấu cách, để "đ ặ t h à n g"
+    (gộp thành "đặthàng") vẫn khớp "đặt hàng".
+    """
+
+    def __init__(self, store, default_words, section='keywords'):
+        self.store = store
+        self.default_words = list(default_words)
+        self.section = section
+        self._lock = threading.Lock()
+        self._by_thread = {}  # thread_id -> (phiên bản cấu hình, engine)
+        self._by_config = {}  # cấu hình -> engine, dùng chung cho các nhóm cùng cấu hình
+        self._version = None
+
+    def _config(self, thread_id):
+        """Lấy cấu hình từ khóa của nhóm, rơi về 'default' rồi về danh sách mặc định."""
+        config = self.store.get(self.section, thread_id) or self.store.get(self.section, 'default') or {}
+        if isinstance(config, list):
+            config = {'words': config}
+        return (
+            tuple(config.get('words') or self.default_words),
+            bool(config.get('strip_tones', False)),
+            bool(config.get('collapse_separators', True))
+        )
+
+    def _engine(self, thread_id):
+        """Lấy (automaton, automaton không dấu cách, tùy chọn chuẩn hóa) cho nhóm, dựng lại nếu cấu hình đã đổi."""
+        version = self.store.current_version()
+        cached = self._by_thread.get(thread_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        config = self._config(thread_id)
+        with self._lock:
+            if version != self._version:
+                self._by_config.clear()
+                self._version = version
+            engine = self._by_config.get(config)
+            if engine is None:
+                words, strip_tones, collapse_separators = config
+                normalized = [(normalize(word, strip_tones, collapse_separators), word) for word in words]
+                automaton = AhoCorasick(normalized)
+                # Chỉ từ khóa nhiều chữ: bỏ dấu cách với từ một chữ dễ khớp nhầm qua ranh giới hai từ
+                spaced = [(key.replace(' ', ''), word) for key, word in normalized if ' ' in key.strip()]
+                joined = AhoCorasick(spaced) if spaced else None
+                engine = self._by_config[config] = (automaton, joined, strip_tones, collapse_separators)
+            self._by_thread[thread_id] = (version, engine)
+        return engine
+
+    def match(self, thread_id, text):
+        """Trả về từ khóa đầu tiên xuất hiện trong tin nhắn, None nếu không có."""
+        if not isinstance(text, str) or not text:
+            return None
+        automaton, joined, strip_tones, collapse_separators = self._engine(thread_id)
+        text = normalize(text, strip_tones, collapse_separators)
+        keyword = automaton.search(text)
+        if keyword is None and joined is not None:
+            keyword = joined.search(text.replace(' ', ''))
+        return keyword
@@ -0,0 +1,86 @@
+import re
+
+# Hai dạng liên kết, cùng tập bắt được với regex cũ (https?://\S+|www\.\S+|(?:[a-z0-9-]+\.)+[a-z]{2,}):
+#   - url:    http(s)://... hoặc www.... ở bất kỳ đâu, phải có tên miền ngay sau ("www." trơn không tính)
+#   - domain: chuỗi nhãn ngăn cách bởi dấu chấm (abc.xyz.com), TLD bắt đầu bằng ít nhất 2 chữ cái
+# Không quay lui theo bình phương với tin nhắn dài toàn dấu chấm như "a.a.a.a...":
+#   - domain chỉ bắt đầu ở đầu một chuỗi ký tự nhãn (như \b nhưng chỉ xét chữ ASCII, nên
+#     "giáshopee.vn" hay "...shopee.vn" vẫn bắt được), không bắt đầu lại ở giữa nhãn;
+#   - bắt cả chuỗi nhãn dài nhất rồi mới cắt phần TLD trong _domain_link.
+# Không lower() tin nhắn: phần http(s)://, www. tự không phân biệt hoa thường bằng (?i:...),
+# phần domain đã liệt kê sẵn cả chữ hoa lẫn chữ thường.
+URL_PATTERN = re.compile(r'(?i:https?://|www\.)(?P<host>[^\s/?#:]+)\S*')
+DOMAIN_PATTERN = re.compile(r'(?<![a-zA-Z0-9-])[a-zA-Z0-9-]+(?:\.[a-zA-Z0-9-]+)+')
+_TLD_PREFIX = re.compile(r'[a-zA-Z]{2,}')
+
+
+def _domain_link(run):
+    """Phần liên kết trong chuỗi nhãn: tới nhãn cuối cùng bắt đầu bằng ít nhất 2 chữ cái (TLD).
+
+    'shopee.vn.1' -> 'shopee.vn', 'abc.com.vn2' -> 'abc.com.vn', '7.85' -> None.
+    """
+    labels = run.split('.')
+    for index in range(len(labels) - 1, 0, -1):
+        tld = _TLD_PREFIX.match(labels[index])
+        if tld:
+            return '.'.join(labels[:index]) + '.' + tld.group(0)
+    return None
+
+
+def _links(text):
+    """Các (vị trí, liên kết, tên miền) trong văn bản theo thứ tự xuất hiện."""
+    links = []
+    spans = []
+    if '://' in text or 'www.' in text.lower():
+        for match in URL_PATTERN.finditer(text):
+            links.append((match.start(), match.group(0), match.group('host')))
+            spans.append(match.span())
+    for match in DOMAIN_PATTERN.finditer(text):
+        start, end = match.span()
+        for url_start, url_end in spans:
+            if url_start <= start < url_end:
+                break
+            if start < url_start < end:
+                # url (không có khoảng trắng) bắt đầu giữa chuỗi nhãn: chỉ xét phần trước url
+                end = url_start
+        else:
+            link = _domain_link(text[start:end].rstrip('.'))
+            if link is not None:
+                links.append((start, link, link))
+    links.sort()
+    return links
+
+
+class LinkScanner:
+    """Bộ phát hiện liên kết biên dịch một lần, hỗ trợ danh sách tên miền được phép."""
+
+    def __init__(self, allowed_domains=()):
+        self.allowed_domains = frozenset(domain.lower().lstrip('.') for domain in allowed_domains)
+
+    def _is_allowed(self, host):
+        """Tên miền nằm trong danh sách cho phép (tính cả tên miền con)."""
+        if not self.allowed_domains:
+            return False
+        host = host.lower().rstrip('.')
+        if host.startswith('www.'):
+            host = host[4:]
+        while host:
+            if host in self.allowed_domains:
+                return True
+            _, _, host = host.partition('.')
+        return False
+
+    def find(self, *texts):
+        """Trả về liên kết đầu tiên không được phép trong các đoạn văn bản, None nếu không có."""
+        for text in texts:
+            # Mọi liên kết đều có dấu chấm hoặc '://': bỏ qua nhanh tin nhắn thường
+            if not isinstance(text, str) or ('.' not in text and '://' not in text):
+                continue
+            for _, link, host in _links(text):
+                if not self._is_allowed(host):
+                    return link
+        return None
+
+    def has_link(self, *texts):
+        """Kiểm tra các đoạn văn bản có chứa liên kết không được phép."""
+        return self.find(*texts) is not None
@@ -0,0 +1,316 @@
+"""Bộ phân loại tin nhắn buôn bán chạy cục bộ: hồi quy logistic trên n-gram ký tự đã băm.
+
+Mô hình học dần từ kết quả của GPT; chỉ tự quyết khi đủ chắc chắn, phần lưng chừng vẫn hỏi GPT.
+Huấn luyện/đánh giá ngoại tuyến từ nhật ký kết quả GPT:
+    python local_classifier.py gpt_verdicts.jsonl gpt_verdicts.jsonl.1 --model selling_model.bin --target 0.97
+Cặp ngưỡng đạt --target được lưu cùng trọng số và bot dùng nó thay cho LOCAL_THRESHOLDS.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from persistence import atomic_write, start_autosave
+from verdict_cache import canonical
+
+# Constants
+LOCAL_HASH_BITS = 18  # 2^18 trọng số (2 MB)
+LOCAL_NGRAMS = (2, 3, 4)
+LOCAL_LEARNING_RATE = 0.2
+LOCAL_THRESHOLDS = (0.1, 0.9)  # Mặc định khi file mô hình chưa có ngưỡng: <= 0.1 không buôn bán, >= 0.9 buôn bán, ở giữa hỏi GPT
+LOCAL_MIN_EXAMPLES = 300  # Chưa học đủ số mẫu này thì luôn hỏi GPT
+LOCAL_AUDIT_RATE = 0.02  # Tỉ lệ tin đã tự quyết vẫn gửi GPT để theo dõi độ chính xác
+VERDICT_LOG_MAX_BYTES = 20 * 1024 * 1024  # Xoay nhật ký kết quả GPT khi vượt 20 MB
+VERDICT_LOG_BACKUPS = 2  # Giữ gpt_verdicts.jsonl.1, .2
+
+_MODEL_HEADER = struct.Struct('<8sIQddd')  # magic, bits, số mẫu, bias, ngưỡng dưới, ngưỡng trên
+_MODEL_MAGIC = b'ZLSELL02'
+_MODEL_HEADER_V1 = struct.Struct('<8sIQd')  # Bản cũ chưa lưu ngưỡng
+_MODEL_MAGIC_V1 = b'ZLSELL01'
+
+
+def features(text, bits=LOCAL_HASH_BITS):
+    """Các n-gram ký tự của dạng chuẩn tin nhắn, băm về {chỉ số: trọng số} đã chuẩn hóa độ dài."""
+    text = f" {canonical(text)} "
+    mask = (1 << bits) - 1
+    counts = {}
+    for n in LOCAL_NGRAMS:
+        for i in range(len(text) - n + 1):
+            index = zlib.crc32(text[i:i + n].encode('utf-8')) & mask
+            counts[index] = counts.get(index, 0) + 1
+    if counts:
+        scale = 1 / math.sqrt(sum(count * count for count in counts.values()))
+        for index in counts:
+            counts[index] *= scale
+    return counts
+
+
+def _sigmoid(z):
+    if z >= 0:
+        return 1 / (1 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1 + e)
+
+
+class LocalClassifier:
+    """Hồi quy logistic học trực tuyến, trọng số lưu trong mảng số thực cố định kích thước."""
+
+    def __init__(self, path=None, bits=LOCAL_HASH_BITS, thresholds=LOCAL_THRESHOLDS,
+                 min_examples=LOCAL_MIN_EXAMPLES, audit_rate=LOCAL_AUDIT_RATE, learning_rate=LOCAL_LEARNING_RATE):
+        self.path = path
+        self.bits = bits
+        self.low, self.high = thresholds
+        self.min_examples = min_examples
+        self.audit_rate = audit_rate
+        self.learning_rate = learning_rate
+        self.weights = array('d', bytes(8 << bits))
+        self.bias = 0.0
+        self.examples = 0
+        self.decided = 0
+        self.escalated = 0
+        self.audited = 0
+        self.audit_agreed = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def predict(self, text, x=None):
+        """Xác suất tin nhắn là buôn bán."""
+        x = features(text, self.bits) if x is None else x
+        weights = self.weights
+        return _sigmoid(self.bias + sum(weights[index] * value for index, value in x.items()))
+
+    def decide(self, text):
+        """True/False nếu đủ chắc chắn, None nếu cần hỏi GPT."""
+        if self.examples < self.min_examples:
+            self.escalated += 1
+            return None
+        probability = self.predict(text)
+        if self.low < probability < self.high:
+            self.escalated += 1
+            return None
+        if random.random() < self.audit_rate:
+            # Vẫn hỏi GPT để đo độ chính xác của các quyết định cục bộ
+            self.escalated += 1
+            return None
+        self.decided += 1
+        return probability >= self.high
+
+    def learn(self, text, verdict):
+        """Cập nhật mô hình bằng một kết quả của GPT (một bước SGD)."""
+        x = features(text, self.bits)
+        with self._lock:
+            probability = self.predict(text, x)
+            if self.examples >= self.min_examples and (probability <= self.low or probability >= self.high):
+                self.audited += 1
+                self.audit_agreed += (probability >= self.high) == bool(verdict)
+            step = self.learning_rate * ((1.0 if verdict else 0.0) - probability)
+            weights = self.weights
+            for index, value in x.items():
+                weights[index] += step * value
+            self.bias += step
+            self.examples += 1
+            self._dirty = True
+
+    def stats(self):
+        """Số tin tự quyết, số tin hỏi GPT và độ chính xác đo được trên các tin được kiểm tra lại."""
+        total = self.decided + self.escalated
+        return {
+            'examples': self.examples,
+            'decided': self.decided,
+            'escalated': self.escalated,
+            'saved_rate': self.decided / total if total else 0.0,
+            'audit_accuracy': self.audit_agreed / self.audited if self.audited else None
+        }
+
+    def load(self):
+        """Đọc trọng số và ngưỡng đã lưu; bỏ qua nếu không có file hoặc khác kích thước."""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'rb') as file:
+                header = file.read(_MODEL_HEADER_V1.size)
+                magic, bits, examples, bias = _MODEL_HEADER_V1.unpack(header)
+                low, high = self.low, self.high
+                if magic == _MODEL_MAGIC:
+                    header += file.read(_MODEL_HEADER.size - len(header))
+                    magic, bits, examples, bias, low, high = _MODEL_HEADER.unpack(header)
+                if magic not in (_MODEL_MAGIC, _MODEL_MAGIC_V1) or bits != self.bits:
+                    print(f"Bỏ qua mô hình {self.path}: sai định dạng")
+                    return
+                weights = array('d')
+                weights.fromfile(file, 1 << bits)
+        except FileNotFoundError:
+            return
+        except (OSError, EOFError, struct.error) as e:
+            print(f"Lỗi khi đọc mô hình phân loại: {e}")
+            return
+        if sys.byteorder == 'big':
+            weights.byteswap()
+        with self._lock:
+            self.weights, self.bias, self.examples = weights, bias, examples
+            self.low, self.high = low, high
+
+    def save(self):
+        """Ghi trọng số ra file tạm rồi rename."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            weights = array('d', self.weights)
+            header = _MODEL_HEADER.pack(_MODEL_MAGIC, self.bits, self.examples, self.bias, self.low, self.high)
+            self._dirty = False
+        if sys.byteorder == 'big':
+            weights.byteswap()
+        try:
+            with atomic_write(self.path, prefix='.model-') as file:
+                file.write(header)
+                weights.tofile(file)
+        except OSError as e:
+            print(f"Lỗi khi ghi mô hình phân loại: {e}")
+
+    def start_autosave(self, interval=300):
+        """Định kỳ lưu mô hình và lưu lần cuối khi thoát."""
+        start_autosave(self.save, interval, 'model-autosave')
+
+
+class VerdictLog:
+    """Nhật ký (tin nhắn, kết quả GPT) dạng JSON lines để huấn luyện lại ngoại tuyến, xoay vòng theo kích thước."""
+
+    def __init__(self, path, max_bytes=VERDICT_LOG_MAX_BYTES, backups=VERDICT_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def _rotate(self):
+        """Đổi tên path -> path.1 -> path.2 ..., bỏ file cũ nhất (giống RotatingFileHandler)."""
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+    def append(self, message, verdict):
+        """Ghi thêm một dòng vào nhật ký, xoay file trước nếu dòng mới làm vượt max_bytes."""
+        if not self.path:
+            return
+        line = json.dumps({'message': message, 'verdict': bool(verdict)}, ensure_ascii=False) + '\n'
+        try:
+            with self._lock:
+                if self.max_bytes and os.path.exists(self.path):
+                    if os.path.getsize(self.path) + len(line.encode('utf-8')) > self.max_bytes:
+                        self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(line)
+        except OSError as e:
+            print(f"Lỗi khi ghi nhật ký kiểm duyệt: {e}")
+
+
+def read_verdicts(*paths):
+    """Đọc các cặp (tin nhắn, kết quả) từ một hoặc nhiều file nhật ký, bỏ qua dòng hỏng."""
+    pairs = []
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    row = json.loads(line)
+                    pairs.append((row['message'], bool(row['verdict'])))
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return pairs
+
+
+def evaluate(model, pairs, thresholds):
+    """Với mỗi cặp ngưỡng: tỉ lệ tin tự quyết, độ chính xác phần tự quyết và độ chính xác tổng thể.
+
+    Tin nằm giữa hai ngưỡng được hỏi GPT nên được tính là đúng (nhãn chính là kết quả của GPT).
+    """
+    probabilities = [(model.predict(message), verdict) for message, verdict in pairs]
+    rows = []
+    for low, high in thresholds:
+        decided = correct = 0
+        for probability, verdict in probabilities:
+            if low < probability < high:
+                continue
+            decided += 1
+            correct += (probability >= high) == verdict
+        total = len(probabilities)
+        rows.append({
+            'low': low,
+            'high': high,
+            'saved_rate': decided / total if total else 0.0,
+            'local_accuracy': correct / decided if decided else 1.0,
+            'overall_accuracy': (correct + total - decided) / total if total else 1.0
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', nargs='+', help='nhật ký kết quả GPT (JSON lines: message, verdict), kể cả các file .1, .2 đã xoay')
+    parser.add_argument('--model', default='selling_model.bin', help='file mô hình sẽ ghi')
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--test-split', type=float, default=0.2, help='tỉ lệ dữ liệu giữ lại để đánh giá')
+    parser.add_argument('--target', type=float, default=0.97, help='độ chính xác tổng thể tối thiểu')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    pairs = read_verdicts(*args.log)
+    if not pairs:
+        print(f"Không có dữ liệu trong {', '.join(args.log)}")
+        return
+    random.seed(args.seed)
+    random.shuffle(pairs)
+    split = int(len(pairs) * (1 - args.test_split))
+    train, test = pairs[:split], pairs[split:]
+
+    model = LocalClassifier()
+    for _ in range(args.epochs):
+        random.shuffle(train)
+        for message, verdict in train:
+            model.learn(message, verdict)
+
+    positives = sum(verdict for _, verdict in pairs)
+    print(f"📚 {len(train)} mẫu huấn luyện, {len(test)} mẫu đánh giá ({positives / len(pairs):.0%} buôn bán)")
+    thresholds = [(0.5 - margin, 0.5 + margin) for margin in (0.0, 0.1, 0.2, 0.3, 0.4, 0.45, 0.49)]
+    rows = evaluate(model, test, thresholds)
+    print(f"{'ngưỡng':<14}{'tự quyết':>10}{'đúng (cục bộ)':>16}{'đúng (tổng)':>14}")
+    for row in rows:
+        print(f"{row['low']:.2f}-{row['high']:.2f}{'':<5}{row['saved_rate']:>10.1%}"
+              f"{row['local_accuracy']:>16.1%}{row['overall_accuracy']:>14.1%}")
+
+    passing = [row for row in rows if row['overall_accuracy'] >= args.target]
+    if passing:
+        # Cùng tỉ lệ tự quyết thì lấy ngưỡng rộng hơn cho an toàn vì ngưỡng này được bot dùng thật
+        best = max(passing, key=lambda row: (row['saved_rate'], row['high'] - row['low']))
+        chosen = (best['low'], best['high'])
+        print(f"✅ Ngưỡng {best['low']:.2f}/{best['high']:.2f} tiết kiệm {best['saved_rate']:.1%} lần gọi GPT "
+              f"với độ chính xác {best['overall_accuracy']:.1%} (mục tiêu {args.target:.0%})")
+    else:
+        # Ngưỡng rộng nhất: gần như mọi tin vẫn hỏi GPT cho tới khi có đủ dữ liệu
+        chosen = (thresholds[-1][0], thresholds[-1][1])
+        print(f"⚠️ Chưa ngưỡng nào đạt độ chính xác {args.target:.0%}, cần thêm dữ liệu; "
+              f"lưu ngưỡng {chosen[0]:.2f}/{chosen[1]:.2f}")
+
+    # Mô hình ghi ra được học trên toàn bộ dữ liệu, kèm ngưỡng đã chọn
+    final = LocalClassifier(path=args.model, thresholds=chosen)
+    for _ in range(args.epochs):
+        random.shuffle(pairs)
+        for message, verdict in pairs:
+            final.learn(message, verdict)
+    final.save()
+    print(f"💾 Đã lưu mô hình vào {args.model}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+from array import array
+from bisect import bisect_left
+
+
+def _parse(mem_ver_list):
+    """Tách các mục 'memberId_version' thành hai mảng số đã sắp xếp theo memberId."""
+    pairs = []
+    for member in mem_ver_list:
+        member_id, _, version = member.partition('_')
+        try:
+            pairs.append((int(member_id), int(version or 0)))
+        except ValueError:
+            print(f"Bỏ qua thành viên không hợp lệ: {member}")
+    pairs.sort()
+    return array('Q', [member_id for member_id, _ in pairs]), array('Q', [version for _, version in pairs])
+
+
+class MemberSnapshot:
+    """Danh sách thành viên của một nhóm dạng gọn: mảng memberId (uint64) đã sắp xếp và phiên bản tương ứng.
+
+    Chỉ giữ dạng đã phân tích thay cho memVerList gốc; fingerprint giúp bỏ qua bước phân tích
+    khi danh sách không đổi.
+    """
+
+    __slots__ = ('ids', 'versions', 'fingerprint')
+
+    def __init__(self, ids, versions, fingerprint):
+        self.ids = ids
+        self.versions = versions
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def parse(cls, mem_ver_list):
+        """Tạo snapshot từ memVerList của fetchGroupInfo."""
+        ids, versions = _parse(mem_ver_list)
+        return cls(ids, versions, hash(tuple(mem_ver_list)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, member_id):
+        member_id = int(member_id)
+        i = bisect_left(self.ids, member_id)
+        return i < len(self.ids) and self.ids[i] == member_id
+
+    def diff(self, mem_ver_list):
+        """So sánh với memVerList mới, trả về (joined, left, snapshot mới); memberId dạng chuỗi."""
+        fingerprint = hash(tuple(mem_ver_list))
+        if fingerprint == self.fingerprint:
+            return [], [], self
+        ids, versions = _parse(mem_ver_list)
+        if ids == self.ids:
+            # Chỉ đổi phiên bản thành viên, không có ai ra/vào
+            return [], [], MemberSnapshot(ids, versions, fingerprint)
+
+        # Duyệt song song hai mảng đã sắp xếp, không cần dựng set
+        joined, left = [], []
+        old, new = self.ids, ids
+        i = j = 0
+        while i < len(old) and j < len(new):
+            if old[i] == new[j]:
+                i += 1
+                j += 1
+            elif old[i] < new[j]:
+                left.append(str(old[i]))
+                i += 1
+            else:
+                joined.append(str(new[j]))
+                j += 1
+        left.extend(str(member_id) for member_id in old[i:])
+        joined.extend(str(member_id) for member_id in new[j:])
+        return joined, left, MemberSnapshot(ids, versions, fingerprint)
@@ -0,0 +1,287 @@
+"""Đo thời gian và đếm sự kiện theo từng bước xử lý, xuất ra HTTP theo định dạng Prometheus.
+
+Tắt hoàn toàn bằng biến môi trường BOT_METRICS=0: timed() trả về nguyên hàm gốc, timer() trả về
+một context rỗng dùng chung.
+Xem nhanh số liệu của bot đang chạy: python metrics.py --port 9108
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Constants
+METRICS_ENABLED = os.environ.get('BOT_METRICS', '1') != '0'
+METRICS_PORT = 9108
+METRICS_PREFIX = 'zalobot'
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+_SUB_BUCKETS = 16  # 16 ô cho mỗi lũy thừa của 2: sai số tương đối tối đa ~6%
+_MAX_BUCKETS = 16 * 40
+
+
+def _quantile_key(q):
+    """Tên phân vị trong snapshot: 0.5 -> 'p50', 0.999 -> 'p99.9'."""
+    return f"p{q * 100:g}"
+
+
+def _bucket_index(micros):
+    """Chỉ số ô log-tuyến tính (kiểu HDR) của một giá trị micro giây."""
+    if micros < 2 * _SUB_BUCKETS:
+        return max(0, micros)
+    shift = micros.bit_length() - 5
+    return min(_MAX_BUCKETS - 1, _SUB_BUCKETS * shift + (micros >> shift))
+
+
+def _bucket_upper(index):
+    """Giá trị lớn nhất (micro giây) thuộc ô index."""
+    if index < 2 * _SUB_BUCKETS - 1:
+        return index
+    shift = index // _SUB_BUCKETS - 1
+    return ((index % _SUB_BUCKETS + _SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram:
+    """Histogram độ trễ với ô log-tuyến tính: bộ nhớ cố định, ghi O(1), tính phân vị từ các ô."""
+
+    def __init__(self):
+        self.buckets = [0] * _MAX_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        index = _bucket_index(int(seconds * 1e6))
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """Phân vị q (giây), lấy cận trên của ô chứa nó."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for index, bucket in enumerate(self.buckets):
+                seen += bucket
+                if bucket and seen >= rank:
+                    return min(self.max, _bucket_upper(index) / 1e6)
+            return self.max
+
+    def summary(self):
+        summary = {_quantile_key(q): self.quantile(q) for q in QUANTILES}
+        summary.update(count=self.count, sum=self.total, max=self.max)
+        return summary
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Sổ ghi số liệu: histogram theo bước xử lý, bộ đếm sự kiện và gauge độ sâu hàng đợi."""
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._counter_reads = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        return histogram
+
+    def timer(self, stage):
+        """Context manager đo thời gian một bước: with metrics.timer('link_scan'): ..."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(stage))
+
+    def timed(self, stage):
+        """Decorator đo thời gian mỗi lần gọi hàm; khi tắt trả về nguyên hàm gốc."""
+        def decorate(func):
+            if not self.enabled:
+                return func
+            histogram = self.histogram(stage)
+
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.record(time.perf_counter() - started)
+
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            wrapper.__wrapped__ = func
+            return wrapper
+        return decorate
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).record(seconds)
+
+    def inc(self, event, amount=1):
+        if self.enabled:
+            with self._lock:
+                self._counters[event] = self._counters.get(event, 0) + amount
+
+    def gauge(self, name, read):
+        """Đăng ký gauge: read() được gọi khi xuất số liệu, ví dụ độ sâu hàng đợi."""
+        if self.enabled:
+            self._gauges[name] = read
+
+    def counter(self, name, read):
+        """Đăng ký bộ đếm do module khác tự giữ: read() được gọi khi xuất số liệu, ví dụ số lần trúng cache."""
+        if self.enabled:
+            self._counter_reads[name] = read
+
+    def snapshot(self):
+        """Toàn bộ số liệu hiện tại dạng dict."""
+        gauges = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                gauges[name] = read()
+            except Exception:
+                gauges[name] = None
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        for name, read in list(self._counter_reads.items()):
+            try:
+                counters[name] = read()
+            except Exception:
+                pass
+        return {
+            'uptime': time.time() - self.started,
+            'stages': {stage: histogram.summary() for stage, histogram in sorted(histograms.items())},
+            'counters': dict(sorted(counters.items())),
+            'gauges': gauges
+        }
+
+    def render_prometheus(self):
+        """Số liệu theo định dạng text của Prometheus."""
+        snapshot = self.snapshot()
+        lines = [f'# TYPE {METRICS_PREFIX}_stage_seconds summary']
+        for stage, summary in snapshot['stages'].items():
+            label = _label(stage)
+            for q in QUANTILES:
+                lines.append(f'{METRICS_PREFIX}_stage_seconds{{stage="{label}",quantile="{q}"}} {summary[_quantile_key(q)]:.6f}')
+            lines.append(f'{METRICS_PREFIX}_stage_seconds_sum{{stage="{label}"}} {summary["sum"]:.6f}')
+            lines.append(f'{METRICS_PREFIX}_stage_seconds_count{{stage="{label}"}} {summary["count"]}')
+        lines.append(f'# TYPE {METRICS_PREFIX}_events_total counter')
+        for event, value in snapshot['counters'].items():
+            lines.append(f'{METRICS_PREFIX}_events_total{{event="{_label(event)}"}} {value}')
+        lines.append(f'# TYPE {METRICS_PREFIX}_queue_depth gauge')
+        for name, value in snapshot['gauges'].items():
+            if value is not None:
+                lines.append(f'{METRICS_PREFIX}_queue_depth{{queue="{_label(name)}"}} {value}')
+        lines.append(f'# TYPE {METRICS_PREFIX}_uptime_seconds gauge')
+        lines.append(f'{METRICS_PREFIX}_uptime_seconds {snapshot["uptime"]:.0f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return re.sub(r'[^a-zA-Z0-9_.:-]', '_', str(value))
+
+
+def format_snapshot(snapshot):
+    """Bảng số liệu dễ đọc từ kết quả của Metrics.snapshot()."""
+    lines = [f"{'bước':<24}{'số lần':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for stage, summary in snapshot['stages'].items():
+        lines.append(f"{stage:<24}{summary['count']:>9}{summary['p50'] * 1000:>10.2f}"
+                     f"{summary['p99'] * 1000:>10.2f}{summary['max'] * 1000:>10.2f}")
+    if snapshot['counters']:
+        lines.append('')
+        lines.extend(f"{event:<24}{value:>9}" for event, value in snapshot['counters'].items())
+    if snapshot['gauges']:
+        lines.append('')
+        lines.extend(f"{name:<24}{value if value is not None else '-':>9}" for name, value in snapshot['gauges'].items())
+    return '\n'.join(lines)
+
+
+def start_metrics_server(port=METRICS_PORT, registry=None):
+    """Chạy HTTP nội bộ: /metrics (Prometheus) và /snapshot (JSON). Trả về server, None nếu đã tắt số liệu."""
+    registry = registry or metrics
+    if not registry.enabled:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith('/snapshot'):
+                body, content_type = json.dumps(registry.snapshot()), 'application/json'
+            elif self.path.startswith('/metrics'):
+                body, content_type = registry.render_prometheus(), 'text/plain; version=0.0.4'
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+metrics = Metrics()
+timed = metrics.timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In số liệu hiện tại của bot đang chạy')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=METRICS_PORT)
+    args = parser.parse_args()
+    with urllib.request.urlopen(f'http://{args.host}:{args.port}/snapshot', timeout=5) as response:
+        print(format_snapshot(json.loads(response.read())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import logging
+import queue
+import threading
+import time
+
+from bot_log import get_logger, log_event
+
+# Constants
+MODERATION_WORKERS = 4
+MODERATION_QUEUE_SIZE = 200
+MODERATION_DEADLINE = 15  # Số giây tối đa từ lúc nhận tin nhắn tới lúc có kết quả
+
+moderation_log = get_logger('moderation')
+
+
+class ModerationPool:
+    """Nhóm luồng kiểm duyệt chạy classify() ngoài luồng listener, hàng đợi có giới hạn."""
+
+    def __init__(self, classify, workers=MODERATION_WORKERS, max_queue=MODERATION_QUEUE_SIZE,
+                 deadline=MODERATION_DEADLINE):
+        self.classify = classify
+        self.deadline = deadline
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.expired = 0
+        self.rejected = 0
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f'moderation-{i}', daemon=True)
+            thread.start()
+
+    def submit(self, message, on_verdict):
+        """Đưa tin nhắn vào hàng đợi, on_verdict(kết quả, lý do) được gọi từ luồng kiểm duyệt.
+
+        Không có kết quả thì kết quả là None và lý do là 'timeout' (quá hạn, kể cả khi còn trong hàng đợi)
+        hoặc 'error'; có kết quả thì lý do là None.
+        Trả về False nếu hàng đợi đầy để bên gọi tự xử lý (ví dụ xóa theo từ khóa).
+        """
+        try:
+            self._queue.put_nowait((time.monotonic() + self.deadline, message, on_verdict))
+            return True
+        except queue.Full:
+            self.rejected += 1
+            return False
+
+    def qsize(self):
+        """Số tin nhắn đang chờ kiểm duyệt."""
+        return self._queue.qsize()
+
+    def _classify(self, deadline, message):
+        """(kết quả, lý do) của classify trong thời gian còn lại."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # Quá hạn khi còn trong hàng đợi
+            self.expired += 1
+            return None, 'timeout'
+        try:
+            verdict = self.classify(message, timeout=remaining)
+        except Exception as e:
+            log_event(moderation_log, 'classify_failed', logging.WARNING, error=str(e))
+            return None, 'error'
+        if verdict is None:
+            # classify trả về None khi hết thời gian chờ hoặc lỗi
+            return None, 'timeout' if time.monotonic() >= deadline else 'error'
+        return verdict, None
+
+    def _worker(self):
+        """Lấy tin nhắn khỏi hàng đợi, gọi classify trong thời gian còn lại rồi gọi on_verdict."""
+        while True:
+            deadline, message, on_verdict = self._queue.get()
+            try:
+                on_verdict(*self._classify(deadline, message))
+            except Exception as e:
+                log_event(moderation_log, 'verdict_handler_failed', logging.ERROR, error=str(e))
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,126 @@
+"""Máy chủ giả lập API chat completions của OpenAI để chạy thử kiểm duyệt không cần mạng.
+
+Chạy: python openai_stub.py --port 8001 --latency 800
+rồi đặt OPENAI_API_BASE=http://127.0.0.1:8001/v1 trước khi chạy update.py.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Từ khóa dùng để giả lập câu trả lời của GPT
+SELLING_HINTS = ('bán', 'giá', 'chốt đơn', 'ship', 'order', 'sale', 'inbox', 'sỉ', 'ctv', 'khuyến mãi')
+
+
+def fake_verdict(text):
+    """Câu trả lời giả lập: 'yes' nếu tin nhắn có từ gợi ý buôn bán."""
+    lowered = text.lower()
+    return 'yes' if any(hint in lowered for hint in SELLING_HINTS) else 'no'
+
+
+class StubState:
+    """Cấu hình và bộ đếm của máy chủ giả lập."""
+
+    def __init__(self, latency=0.0, malformed_rate=0.0):
+        self.latency = latency
+        self.malformed_rate = malformed_rate
+        self.requests = 0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def count(self, items):
+        """Ghi nhận một lần gọi API với số tin nhắn trong đó."""
+        with self._lock:
+            self.requests += 1
+            self.items += items
+
+
+def make_handler(state):
+    """Tạo lớp xử lý HTTP gắn với state."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            """GET /stats: số lần gọi và số tin nhắn đã phân loại."""
+            self._reply(200, {'requests': state.requests, 'items': state.items})
+
+        def do_POST(self):
+            """POST /v1/chat/completions theo định dạng của OpenAI."""
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._reply(404, {'error': {'message': 'not found'}})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            user_text = next((m['content'] for m in reversed(payload.get('messages', [])) if m.get('role') == 'user'), '')
+            # Lô tin nhắn được gửi dạng mảng JSON, tin lẻ dạng văn bản
+            try:
+                items = json.loads(user_text)
+            except ValueError:
+                items = None
+            items = [str(item) for item in items] if isinstance(items, list) else None
+
+            if state.latency:
+                time.sleep(state.latency)
+            if items:
+                state.count(len(items))
+                if random.random() < state.malformed_rate:
+                    # Giả lập câu trả lời thiếu phần tử để kiểm tra đường gọi lại từng tin
+                    content = json.dumps([fake_verdict(item) for item in items[:len(items) // 2]])
+                else:
+                    content = json.dumps([fake_verdict(item) for item in items])
+            else:
+                state.count(1)
+                content = fake_verdict(user_text)
+
+            self._reply(200, {
+                'id': f'chatcmpl-stub-{state.requests}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload.get('model', 'stub'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+            })
+
+    return StubHandler
+
+
+def start_stub(port=0, latency=0.0, malformed_rate=0.0):
+    """Chạy máy chủ giả lập trong luồng nền, trả về (server, state). port=0 để chọn cổng trống."""
+    state = StubState(latency, malformed_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='openai-stub', daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=800, help='độ trễ mỗi lần gọi (ms)')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='tỉ lệ trả lời lô sai định dạng (0-1)')
+    args = parser.parse_args()
+
+    server, state = start_stub(args.port, args.latency / 1000, args.malformed_rate)
+    print(f"🧪 OpenAI stub: http://127.0.0.1:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"📊 {state.requests} lần gọi, {state.items} tin nhắn")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Ghi file nguyên tử và lưu định kỳ, dùng chung cho các thành phần giữ trạng thái trên đĩa."""
+import atexit
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='wb', prefix='.tmp-', encoding=None):
+    """Mở file tạm cùng thư mục với path để ghi, ra khỏi khối with thì fsync rồi rename đè lên path.
+
+    Có lỗi thì xóa file tạm và ném lại ngoại lệ, file cũ được giữ nguyên.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=prefix, suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def start_autosave(save, interval, name):
+    """Gọi save() mỗi interval giây ở luồng nền và một lần cuối khi thoát."""
+    def autosave_loop():
+        while True:
+            time.sleep(interval)
+            save()
+
+    atexit.register(save)
+    thread = threading.Thread(target=autosave_loop, name=name, daemon=True)
+    thread.start()
+    return thread
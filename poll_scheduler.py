@@ -0,0 +1,119 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Constants
+POLL_MIN_INTERVAL = 2  # Nhóm vừa có người ra/vào được kiểm tra lại sau 2 giây
+POLL_MAX_INTERVAL = 60  # Nhóm im ắng giãn dần tới tối đa 60 giây
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_ERROR_DELAY = 300
+POLL_WORKERS = 4
+DISCOVER_INTERVAL = 300  # Chu kỳ gọi fetchAllGroups để tìm nhóm mới
+
+
+class _GroupState:
+    """Lịch kiểm tra của một nhóm."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.failures = 0
+        self.running = False
+        self.removed = False
+
+
+class PollScheduler:
+    """Lập lịch kiểm tra thành viên theo từng nhóm bằng hàng đợi ưu tiên theo thời điểm đến hạn.
+
+    check_group(thread_id) trả về True nếu nhóm có thay đổi; nhóm thay đổi được kiểm tra dày hơn,
+    nhóm im ắng giãn dần, nhóm lỗi lùi theo cấp số nhân. discover() trả về danh sách nhóm hiện có.
+    """
+
+    def __init__(self, check_group, discover=None, workers=POLL_WORKERS, min_interval=POLL_MIN_INTERVAL,
+                 max_interval=POLL_MAX_INTERVAL, discover_interval=DISCOVER_INTERVAL):
+        self.check_group = check_group
+        self.discover = discover
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.discover_interval = discover_interval
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='poll')
+        self._groups = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def start(self, thread_ids):
+        """Xếp lịch cho các nhóm ban đầu và chạy luồng điều phối."""
+        self.add_groups(thread_ids)
+        threading.Thread(target=self._dispatch_loop, name='poll-scheduler', daemon=True).start()
+        if self.discover:
+            threading.Thread(target=self._discover_loop, name='poll-discover', daemon=True).start()
+
+    def add_groups(self, thread_ids):
+        """Thêm nhóm mới, rải đều thời điểm kiểm tra đầu tiên để tránh dồn cục."""
+        now = time.monotonic()
+        with self._cond:
+            for thread_id in thread_ids:
+                state = self._groups.get(thread_id)
+                if state is not None and not state.removed:
+                    continue
+                state = self._groups[thread_id] = _GroupState(self.min_interval)
+                self._schedule(now + random.uniform(0, self.min_interval), thread_id, state)
+
+    def sync_groups(self, thread_ids):
+        """Đồng bộ danh sách nhóm: thêm nhóm mới, bỏ nhóm đã rời."""
+        thread_ids = set(thread_ids)
+        with self._cond:
+            for thread_id, state in self._groups.items():
+                if thread_id not in thread_ids:
+                    state.removed = True
+        self.add_groups(thread_ids)
+
+    def _schedule(self, due, thread_id, state):
+        """Đưa nhóm vào hàng đợi với thời điểm đến hạn due (cần giữ khóa)."""
+        heapq.heappush(self._heap, (due, next(self._seq), thread_id, state))
+        self._cond.notify()
+
+    def _dispatch_loop(self):
+        """Lấy các nhóm đến hạn khỏi hàng đợi và giao cho nhóm luồng kiểm tra."""
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout=timeout)
+                _, _, thread_id, state = heapq.heappop(self._heap)
+                if self._groups.get(thread_id) is not state or state.removed or state.running:
+                    continue
+                state.running = True
+            self._pool.submit(self._run_check, thread_id, state)
+
+    def _run_check(self, thread_id, state):
+        """Kiểm tra một nhóm rồi tính thời điểm kiểm tra kế tiếp."""
+        try:
+            changed = self.check_group(thread_id)
+            state.failures = 0
+            if changed:
+                state.interval = self.min_interval
+            else:
+                state.interval = min(self.max_interval, state.interval * POLL_BACKOFF_FACTOR)
+            delay = state.interval
+        except Exception as e:
+            state.failures += 1
+            delay = min(POLL_MAX_ERROR_DELAY, self.min_interval * 2 ** state.failures)
+            print(f"❌ Lỗi khi kiểm tra nhóm {thread_id} (lần {state.failures}), thử lại sau {delay:.0f}s: {e}")
+
+        with self._cond:
+            state.running = False
+            if not state.removed:
+                self._schedule(time.monotonic() + delay, thread_id, state)
+
+    def _discover_loop(self):
+        """Định kỳ lấy danh sách nhóm để thêm nhóm mới tham gia."""
+        while True:
+            time.sleep(self.discover_interval)
+            try:
+                self.sync_groups(self.discover())
+            except Exception as e:
+                print(f"Lỗi khi cập nhật danh sách nhóm: {e}")
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import namedtuple
+
+# Constants
+PROFILE_TTL = 30 * 60  # Giữ thông tin người dùng trong 30 phút
+PROFILE_BATCH_SIZE = 50  # Số người dùng tối đa trong một lần gọi fetchUserInfo
+PROFILE_MAX_ENTRIES = 20000
+
+Profile = namedtuple('Profile', ['displayName', 'avatar'])
+
+
+def _field(profile, name):
+    """Đọc thuộc tính từ đối tượng hoặc dict trả về bởi zlapi."""
+    value = getattr(profile, name, None)
+    if value is None and isinstance(profile, dict):
+        value = profile.get(name)
+    return value
+
+
+class ProfileCache:
+    """Cache TTL cho displayName/avatar, tải theo lô những người dùng chưa có."""
+
+    def __init__(self, ttl=PROFILE_TTL, batch_size=PROFILE_BATCH_SIZE, max_entries=PROFILE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self._entries = {}  # user_id -> (thời điểm hết hạn, Profile)
+        self._lock = threading.Lock()
+
+    def resolve(self, bot, user_ids):
+        """Trả về dict user_id -> Profile cho toàn bộ user_ids, chỉ gọi API cho người chưa có trong cache."""
+        user_ids = [str(user_id) for user_id in user_ids]
+        now = time.monotonic()
+        result, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry and entry[0] > now:
+                    result[user_id] = entry[1]
+                else:
+                    missing.append(user_id)
+
+        for i in range(0, len(missing), self.batch_size):
+            result.update(self._fetch(bot, missing[i:i + self.batch_size]))
+
+        # Người dùng không tải được (ví dụ đã rời nhóm): dùng bản cũ nếu có
+        for user_id in user_ids:
+            if user_id not in result:
+                with self._lock:
+                    entry = self._entries.get(user_id)
+                result[user_id] = entry[1] if entry else Profile(displayName=user_id, avatar=None)
+        return result
+
+    def get(self, bot, user_id):
+        """Lấy Profile của một người dùng."""
+        return self.resolve(bot, [user_id])[str(user_id)]
+
+    def _fetch(self, bot, user_ids):
+        """Gọi fetchUserInfo một lần cho cả lô và lưu kết quả vào cache."""
+        try:
+            changed_profiles = bot.fetchUserInfo(list(user_ids)).changed_profiles or {}
+        except Exception as e:
+            print(f"Lỗi khi lấy thông tin người dùng: {e}")
+            return {}
+
+        fetched = {}
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for user_id in user_ids:
+                profile = changed_profiles.get(user_id)
+                if profile is None:
+                    continue
+                fetched[user_id] = Profile(
+                    displayName=_field(profile, 'displayName') or user_id,
+                    avatar=_field(profile, 'avatar')
+                )
+                self._entries.pop(user_id, None)
+                self._entries[user_id] = (expires, fetched[user_id])
+            self._evict()
+        return fetched
+
+    def _evict(self):
+        """Giới hạn kích thước cache: bỏ mục hết hạn, sau đó bỏ mục cũ nhất."""
+        if len(self._entries) <= self.max_entries:
+            return
+        now = time.monotonic()
+        for user_id in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[user_id]
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+profile_cache = ProfileCache()
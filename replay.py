@@ -0,0 +1,288 @@
+"""Chạy lại luồng tin nhắn/sự kiện thành viên qua Bot.onMessage và vòng kiểm tra thành viên với ZaloAPI giả lập.
+
+Chạy một script:   python replay.py run update.py --messages 5000 --rate 0
+So sánh hai script: python replay.py bench --messages 5000
+Dùng luồng đã ghi: python replay.py run New.py --stream events.jsonl
+Mỗi dòng của file luồng: {"type": "message", "thread_id", "author_id", "text"} hoặc
+{"type": "join" | "leave", "thread_id", "count"}.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+import fake_zalo  # noqa: E402
+
+# Constants
+SCRIPTS = ('New.py', 'update.py')
+DRAIN_TIMEOUT = 60  # Số giây tối đa chờ các hàng đợi gửi/kiểm duyệt xử lý xong sau khi phát hết luồng
+
+CHAT_TEXTS = [
+    "Chào cả nhà, hôm nay mọi người thế nào?",
+    "Tối nay có ai đi đá bóng không?",
+    "Mình vừa xem trận hôm qua, hay thật sự",
+    "Ai có tài liệu môn toán cho mình xin với",
+    "Cảm ơn bạn nhiều nha 😄",
+    "Hẹn 7h ở quán cũ nhé mọi người",
+]
+SUSPECT_TEXTS = [
+    "Mình mới mua cái áo này giá cũng ok",
+    "Có ai order trà sữa chung không",
+    "Bán {item} giá {price}k, ship toàn quốc, inbox ngay",
+    "Shop có sẵn {item}, chốt đơn trong hôm nay giảm {price}k",
+    "Tuyển ctv bán {item}, lãi {price}k mỗi ngày",
+]
+LINK_TEXTS = [
+    "Vào xem ngay https://spam-{n}.example.com/deal",
+    "Nhận quà tại bit.ly/{n}qua",
+]
+ITEMS = ["áo thun", "giày", "son", "điện thoại", "mỹ phẩm"]
+
+
+def synthetic_stream(world, messages, seed=1, suspect_rate=0.1, link_rate=0.03, flood_rate=0.002, member_every=100):
+    """Sinh luồng sự kiện: tin trò chuyện, tin nghi ngờ buôn bán, tin có liên kết, đợt spam và người ra/vào nhóm."""
+    rng = random.Random(seed)
+    thread_ids = sorted(world.groups)
+    members = {thread_id: sorted(world.groups[thread_id]['members']) for thread_id in thread_ids}
+    events = []
+    while len(events) < messages:
+        thread_id = rng.choice(thread_ids)
+        author_id = rng.choice(members[thread_id]) if members[thread_id] else '1'
+        roll = rng.random()
+        if roll < flood_rate:
+            # Một người gửi dồn dập 15 tin giống nhau
+            text = rng.choice(CHAT_TEXTS)
+            events.extend({'type': 'message', 'thread_id': thread_id, 'author_id': author_id, 'text': text}
+                          for _ in range(15))
+            continue
+        if roll < flood_rate + link_rate:
+            text = rng.choice(LINK_TEXTS).format(n=rng.randrange(1000))
+        elif roll < flood_rate + link_rate + suspect_rate:
+            text = rng.choice(SUSPECT_TEXTS).format(item=rng.choice(ITEMS), price=rng.randrange(10, 999))
+        else:
+            text = rng.choice(CHAT_TEXTS)
+        events.append({'type': 'message', 'thread_id': thread_id, 'author_id': author_id, 'text': text})
+        if member_every and len(events) % member_every == 0:
+            events.append({'type': rng.choice(('join', 'leave')), 'thread_id': rng.choice(thread_ids),
+                           'count': rng.randint(1, 4)})
+    return events
+
+
+def load_stream(path):
+    """Đọc luồng sự kiện đã ghi (JSON lines)."""
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def peak_rss_mb():
+    """RSS lớn nhất của tiến trình (MB), None nếu hệ điều hành không hỗ trợ."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _wait_drained(bot, timeout):
+    """Chờ hàng đợi gửi và kiểm duyệt rỗng (ổn định qua vài lần kiểm tra liên tiếp)."""
+    deadline = time.monotonic() + timeout
+    idle_checks = 0
+    while time.monotonic() < deadline and idle_checks < 5:
+        pending = bot.send_scheduler.qsize()
+        if hasattr(bot, 'moderation_pool'):
+            pending += bot.moderation_pool.qsize()
+        idle_checks = idle_checks + 1 if pending == 0 else 0
+        time.sleep(0.2)
+    return idle_checks >= 5
+
+
+def run_replay(script, messages=2000, rate=0.0, groups=20, members=300, latency_scale=1.0,
+               gpt_latency=0.5, check_interval=0.5, stream=None, record=None, seed=1):
+    """Chạy một script với ZaloAPI giả lập, trả về dict kết quả đo."""
+    script_path = os.path.join(REPO_DIR, script) if not os.path.isabs(script) else script
+    workdir = tempfile.mkdtemp(prefix='replay-')
+    os.chdir(workdir)
+
+    latency = {api: delay * latency_scale for api, delay in fake_zalo.DEFAULT_LATENCY.items()}
+    world = fake_zalo.FakeWorld(groups=0 if stream else groups, members=members, latency=latency, seed=seed)
+    if stream:
+        events = load_stream(stream)
+        for thread_id in sorted({event['thread_id'] for event in events}):
+            world.add_group(thread_id, f'Nhóm {thread_id[-4:]}', members)
+    else:
+        events = synthetic_stream(world, messages, seed=seed)
+    if record:
+        with open(record, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+
+    fake_zalo.install(world)
+    stub_state = None
+    if os.path.basename(script_path) == 'update.py':
+        from openai_stub import start_stub
+        server, stub_state = start_stub(latency=gpt_latency)
+        os.environ['OPENAI_API_BASE'] = f'http://127.0.0.1:{server.server_port}/v1'
+
+    module = fake_zalo.load_script(script_path)
+    module.MEMBER_CHECK_INTERVAL = check_interval
+    for thread_id in world.groups:
+        module.settings_store.set('welcome', thread_id, True)
+        module.settings_store.set('flood', thread_id, {})
+
+    started = time.monotonic()
+    bot = module.Bot('api_key', 'secret_key', imei='replay', session_cookies={})
+    while bot.warming_up and time.monotonic() - started < DRAIN_TIMEOUT:
+        time.sleep(0.05)
+    startup = time.monotonic() - started
+    calls_before = dict(world.calls)
+
+    group_type = module.ThreadType.GROUP
+    latencies = []
+    message_count = 0
+    interval = 1 / rate if rate else 0
+    feed_started = time.perf_counter()
+    for i, event in enumerate(events):
+        if interval:
+            delay = feed_started + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if event['type'] == 'message':
+            message_object = types.SimpleNamespace(msgId=str(i), cliMsgId=str(10 ** 12 + i), content=event['text'])
+            t0 = time.perf_counter()
+            bot.onMessage(str(i), event['author_id'], event['text'], message_object, event['thread_id'], group_type)
+            latencies.append(time.perf_counter() - t0)
+            message_count += 1
+        elif event['type'] == 'join':
+            world.join(event['thread_id'], event.get('count', 1))
+        elif event['type'] == 'leave':
+            world.leave(event['thread_id'], event.get('count', 1))
+    feed_seconds = time.perf_counter() - feed_started
+
+    # Cho vòng kiểm tra thành viên thấy các thay đổi cuối cùng rồi chờ các hàng đợi gửi hết
+    time.sleep(2 * check_interval)
+    drained = _wait_drained(bot, DRAIN_TIMEOUT)
+    total_seconds = time.perf_counter() - feed_started
+
+    calls = {api: count - calls_before.get(api, 0) for api, count in world.calls.items()}
+    calls = {api: count for api, count in calls.items() if count}
+    latencies.sort()
+    report = {
+        'script': os.path.basename(script_path),
+        'events': len(events),
+        'messages': message_count,
+        'startup_seconds': startup,
+        'feed_seconds': feed_seconds,
+        'total_seconds': total_seconds,
+        'drained': drained,
+        'messages_per_second': message_count / feed_seconds if feed_seconds else 0.0,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'api_calls': calls,
+        'api_calls_per_event': sum(calls.values()) / len(events) if events else 0.0,
+        'sent': len(world.sent),
+        'deleted': len(world.deleted),
+        'gpt_requests': stub_state.requests if stub_state else 0,
+        'gpt_items': stub_state.items if stub_state else 0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+    metrics = getattr(module, 'metrics', None)
+    if metrics is not None and metrics.enabled:
+        report['metrics'] = metrics.snapshot()
+    return report
+
+
+def print_report(report):
+    print(f"▶ {report['script']}: {report['messages']} tin nhắn, {report['events'] - report['messages']} sự kiện thành viên")
+    print(f"  khởi động {report['startup_seconds']:.2f}s, phát luồng {report['feed_seconds']:.2f}s, "
+          f"tổng {report['total_seconds']:.2f}s{'' if report['drained'] else ' (hàng đợi chưa xử lý hết)'}")
+    print(f"  {report['messages_per_second']:.0f} tin/s, onMessage p50 {report['p50_ms']:.2f} ms, "
+          f"p99 {report['p99_ms']:.2f} ms, max {report['max_ms']:.2f} ms")
+    print(f"  {report['api_calls_per_event']:.3f} lời gọi API/sự kiện: "
+          + ', '.join(f"{api}={count}" for api, count in sorted(report['api_calls'].items())))
+    print(f"  đã gửi {report['sent']}, đã xóa {report['deleted']}, GPT {report['gpt_requests']} lần gọi/"
+          f"{report['gpt_items']} tin, RSS đỉnh {report['peak_rss_mb'] or 0:.1f} MB")
+    if 'metrics' in report:
+        from metrics import format_snapshot
+        print(format_snapshot(report['metrics']))
+
+
+def bench(args, passthrough):
+    """Chạy từng script trong một tiến trình riêng (để đo RSS riêng) và in bảng so sánh."""
+    reports = []
+    for script in args.scripts:
+        command = [sys.executable, os.path.abspath(__file__), 'run', script, '--json'] + passthrough
+        result = subprocess.run(command, capture_output=True, text=True)
+        lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+        if result.returncode != 0 or not lines:
+            print(f"❌ {script} lỗi:\n{result.stderr[-2000:]}")
+            continue
+        reports.append(json.loads(lines[-1]))
+
+    print(f"{'script':<12}{'tin/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'API/sự kiện':>13}{'GPT':>7}{'RSS MB':>9}")
+    for report in reports:
+        print(f"{report['script']:<12}{report['messages_per_second']:>10.0f}{report['p50_ms']:>10.2f}"
+              f"{report['p99_ms']:>10.2f}{report['api_calls_per_event']:>13.3f}{report['gpt_requests']:>7}"
+              f"{report['peak_rss_mb'] or 0:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='chạy lại luồng với một script')
+    run_parser.add_argument('script', choices=SCRIPTS)
+    run_parser.add_argument('--json', action='store_true', help='in kết quả dạng JSON')
+    bench_parser = commands.add_parser('bench', help='so sánh New.py và update.py')
+    bench_parser.add_argument('--scripts', nargs='+', default=list(SCRIPTS))
+
+    for sub in (run_parser, bench_parser):
+        sub.add_argument('--messages', type=int, default=2000, help='số tin nhắn của luồng tổng hợp')
+        sub.add_argument('--rate', type=float, default=0.0, help='số sự kiện mỗi giây (0 = nhanh nhất có thể)')
+        sub.add_argument('--groups', type=int, default=20)
+        sub.add_argument('--members', type=int, default=300, help='số thành viên mỗi nhóm')
+        sub.add_argument('--latency-scale', type=float, default=1.0, help='nhân độ trễ API giả lập')
+        sub.add_argument('--gpt-latency', type=float, default=0.5, help='độ trễ của OpenAI giả lập (giây)')
+        sub.add_argument('--check-interval', type=float, default=0.5, help='MEMBER_CHECK_INTERVAL khi chạy lại')
+        sub.add_argument('--stream', help='file luồng sự kiện đã ghi thay cho luồng tổng hợp')
+        sub.add_argument('--record', help='ghi luồng tổng hợp ra file để chạy lại')
+        sub.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        passthrough = ['--messages', str(args.messages), '--rate', str(args.rate), '--groups', str(args.groups),
+                       '--members', str(args.members), '--latency-scale', str(args.latency_scale),
+                       '--gpt-latency', str(args.gpt_latency), '--check-interval', str(args.check_interval),
+                       '--seed', str(args.seed)]
+        if args.stream:
+            passthrough += ['--stream', os.path.abspath(args.stream)]
+        bench(args, passthrough)
+        return
+
+    report = run_replay(args.script, args.messages, args.rate, args.groups, args.members, args.latency_scale,
+                        args.gpt_latency, args.check_interval, args.stream, args.record, args.seed)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+    else:
+        print_report(report)
+    # Các luồng nền của bot là daemon nhưng autosave/atexit vẫn chạy; thoát ngay sau khi in kết quả
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Constants
+PRIORITY_MODERATION = 0  # Phản hồi lệnh/kiểm duyệt được gửi trước
+PRIORITY_WELCOME = 1  # Chào đón/tạm biệt gửi sau
+GLOBAL_RATE = 5  # Số lần gửi mỗi giây cho cả tài khoản
+GLOBAL_BURST = 10
+THREAD_RATE = 0.5  # Số lần gửi mỗi giây cho một nhóm
+THREAD_BURST = 4
+COALESCE_THRESHOLD = 3  # Từ 3 lời chào đang chờ trở lên thì gộp thành một tin
+SEND_RETRIES = 3
+SEND_BACKOFF = 1.0
+
+
+class TokenBucket:
+    """Bộ đếm token: tối đa burst token, hồi rate token mỗi giây."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        """Hồi token theo thời gian đã trôi qua."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost, now):
+        """Số giây cần chờ để có đủ cost token (0 nếu đã đủ)."""
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (min(cost, self.burst) - self.tokens) / self.rate
+
+    def take(self, cost):
+        """Trừ cost token."""
+        self.tokens -= cost
+
+
+class _Job:
+    """Một lần gửi đang chờ: hàm gửi, nhóm đích, số token cần, số lần đã thử và hàm dọn khi bị bỏ."""
+
+    def __init__(self, thread_id, send, cost, priority, on_drop=None):
+        self.thread_id = thread_id
+        self.send = send
+        self.cost = cost
+        self.priority = priority
+        self.on_drop = on_drop
+        self.attempts = 0
+        self.not_before = 0.0
+
+
+class SendScheduler:
+    """Hàng đợi gửi tin có ưu tiên, giới hạn tốc độ theo nhóm và toàn cục, gộp lời chào và thử lại khi lỗi."""
+
+    def __init__(self, global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST, thread_rate=THREAD_RATE,
+                 thread_burst=THREAD_BURST, coalesce_threshold=COALESCE_THRESHOLD):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.thread_rate = thread_rate
+        self.thread_burst = thread_burst
+        self.coalesce_threshold = coalesce_threshold
+        self._thread_buckets = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._pending = {}  # (thread_id, key) -> danh sách mục chờ gộp
+        self._cond = threading.Condition()
+        self.sent = 0
+        self.failed = 0
+        thread = threading.Thread(target=self._send_loop, name='send-scheduler', daemon=True)
+        thread.start()
+
+    def submit(self, thread_id, send, priority=PRIORITY_MODERATION, cost=1):
+        """Xếp hàng hàm send() để gửi tới nhóm thread_id."""
+        self._push(_Job(thread_id, send, cost, priority))
+
+    def submit_coalescing(self, thread_id, key, item, send_one, send_many, priority=PRIORITY_WELCOME, cost=2):
+        """Xếp hàng một mục có thể gộp (ví dụ lời chào).
+
+        Khi tới lượt gửi, nếu nhóm có từ coalesce_threshold mục cùng key trở lên thì gọi
+        send_many(danh sách mục) một lần, nếu ít hơn thì gửi từng mục bằng send_one(mục).
+        """
+        with self._cond:
+            pending = self._pending.get((thread_id, key))
+            if pending is not None:
+                # Đã có đúng một job phụ trách hàng chờ này, chỉ cần thêm mục
+                pending.append(item)
+                return
+            self._pending[(thread_id, key)] = [item]
+        failed = []  # Các mục của lần gửi lỗi gần nhất, đang nằm đầu hàng chờ
+
+        def reschedule_locked():
+            """Hàng chờ còn mục thì xếp hàng job kế tiếp, hết thì xoá để lần submit sau tạo job mới."""
+            if self._pending[(thread_id, key)]:
+                self._push_locked(_Job(thread_id, send, cost, priority, drop))
+            else:
+                del self._pending[(thread_id, key)]
+
+        def send():
+            """Lấy các mục đang chờ và gửi gộp hoặc gửi lẻ."""
+            with self._cond:
+                pending = self._pending[(thread_id, key)]
+                # Chưa đủ ngưỡng gộp thì chỉ gửi mục đầu, phần còn lại để job kế tiếp
+                count = len(pending) if len(pending) >= self.coalesce_threshold else 1
+                items = pending[:count]
+                del pending[:count]
+            try:
+                if len(items) >= self.coalesce_threshold:
+                    send_many(items)
+                elif items:
+                    send_one(items[0])
+            except Exception:
+                # Trả các mục về hàng chờ để lần thử lại gửi tiếp
+                with self._cond:
+                    self._pending[(thread_id, key)][:0] = items
+                failed[:] = items
+                raise
+            with self._cond:
+                reschedule_locked()
+
+        def drop():
+            """Bỏ các mục đã lỗi quá số lần thử, các mục khác vẫn được gửi tiếp."""
+            with self._cond:
+                del self._pending[(thread_id, key)][:len(failed)]
+                reschedule_locked()
+
+        self._push(_Job(thread_id, send, cost, priority, drop))
+
+    def qsize(self):
+        """Số lần gửi đang chờ."""
+        with self._cond:
+            return len(self._heap)
+
+    def _push(self, job):
+        """Thêm job vào hàng đợi."""
+        with self._cond:
+            self._push_locked(job)
+
+    def _push_locked(self, job):
+        """Thêm job vào hàng đợi khi đã giữ khóa."""
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._cond.notify()
+
+    def _thread_bucket(self, thread_id):
+        """Bộ đếm token riêng của nhóm."""
+        bucket = self._thread_buckets.get(thread_id)
+        if bucket is None:
+            bucket = self._thread_buckets[thread_id] = TokenBucket(self.thread_rate, self.thread_burst)
+        return bucket
+
+    def _next_job(self):
+        """Lấy job ưu tiên cao nhất đã đủ token; nếu chưa có thì trả về (None, số giây nên chờ)."""
+        now = time.monotonic()
+        skipped, job, wait = [], None, 1.0
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            candidate = entry[2]
+            delay = max(candidate.not_before - now,
+                        self._thread_bucket(candidate.thread_id).wait_time(candidate.cost, now),
+                        self.global_bucket.wait_time(candidate.cost, now))
+            if delay <= 0:
+                job = candidate
+                break
+            wait = min(wait, delay)
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if job:
+            self._thread_bucket(job.thread_id).take(job.cost)
+            self.global_bucket.take(job.cost)
+        return job, wait
+
+    def _send_loop(self):
+        """Luồng gửi: chờ job đủ token, gửi, thử lại khi lỗi."""
+        while True:
+            with self._cond:
+                job, wait = self._next_job()
+                while job is None:
+                    self._cond.wait(timeout=wait if self._heap else None)
+                    job, wait = self._next_job()
+            try:
+                job.send()
+                self.sent += 1
+            except Exception as e:
+                job.attempts += 1
+                if job.attempts > SEND_RETRIES:
+                    self.failed += 1
+                    print(f"❌ Bỏ tin nhắn tới {job.thread_id} sau {job.attempts} lần lỗi: {e}")
+                    if job.on_drop:
+                        job.on_drop()
+                    continue
+                # Thử lại với thời gian chờ tăng dần có nhiễu để tránh dồn cục
+                job.not_before = time.monotonic() + SEND_BACKOFF * (2 ** (job.attempts - 1)) * (0.5 + random.random())
+                print(f"⚠️ Lỗi khi gửi tới {job.thread_id}, thử lại lần {job.attempts}: {e}")
+                self._push(job)
@@ -0,0 +1,203 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from persistence import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def _file_lock(path):
+    """Khóa giữa các tiến trình cùng ghi một file cấu hình (qua file <path>.lock)."""
+    with open(path + '.lock', 'a+b') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SettingsStore:
+    """Giữ cấu hình settings.json trong bộ nhớ, chỉ đọc lại khi file thay đổi.
+
+    Nhiều tiến trình có thể cùng ghi một file: khi ghi, các thay đổi đang chờ được áp lên
+    nội dung mới nhất trên đĩa trong lúc giữ khóa file, nên không ghi đè thay đổi của tiến trình khác.
+    """
+
+    def __init__(self, path, check_interval=1.0, flush_delay=0.5):
+        self.path = path
+        self.check_interval = check_interval
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._data = {}
+        self.version = 0  # Tăng mỗi khi cấu hình trong bộ nhớ thay đổi
+        self._stat_key = None
+        self._last_check = 0.0
+        self._dirty = False
+        self._pending = []  # Các thay đổi chưa ghi: ('set', section, key, value) hoặc ('replace', settings)
+        self._flush_timer = None
+        self._load()
+
+    # Đọc file
+    def _file_stat(self):
+        """Trả về (mtime, size) của file, None nếu file không tồn tại."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        """Nạp lại file JSON vào bộ nhớ, tạo file mới nếu chưa tồn tại."""
+        stat_key = self._file_stat()
+        if stat_key is None:
+            self._data = {}
+            self._write_atomic({})
+            self._stat_key = self._file_stat()
+            return
+        self._data = self._read_file()
+        self._stat_key = stat_key
+        self.version += 1
+
+    def _read_file(self):
+        """Đọc nội dung file JSON, trả về {} nếu không có hoặc bị hỏng."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _refresh(self):
+        """Kiểm tra mtime/size theo chu kỳ và nạp lại nếu file bị sửa từ bên ngoài."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        # Không ghi đè thay đổi đang chờ ghi xuống đĩa
+        if self._dirty:
+            return
+        if self._file_stat() != self._stat_key:
+            self._load()
+
+    # Truy vấn
+    def snapshot(self):
+        """Trả về bản sao toàn bộ cấu hình."""
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._data)
+
+    def get(self, section, key, default=None):
+        """Lấy giá trị settings[section][key] từ bộ nhớ."""
+        with self._lock:
+            self._refresh()
+            return self._data.get(section, {}).get(key, default)
+
+    def items(self, section):
+        """Lấy danh sách (key, value) của một mục cấu hình."""
+        with self._lock:
+            self._refresh()
+            return list(self._data.get(section, {}).items())
+
+    def current_version(self):
+        """Trả về phiên bản cấu hình hiện tại, nạp lại trước nếu file đã thay đổi."""
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    # Ghi
+    def set(self, section, key, value):
+        """Gán settings[section][key] và hẹn lịch ghi xuống đĩa."""
+        with self._lock:
+            self._refresh()
+            self._data.setdefault(section, {})[key] = value
+            self._pending.append(('set', section, key, copy.deepcopy(value)))
+            self.version += 1
+            self._schedule_flush()
+
+    def replace(self, settings):
+        """Thay toàn bộ cấu hình và hẹn lịch ghi xuống đĩa."""
+        with self._lock:
+            self._data = copy.deepcopy(settings)
+            self._pending = [('replace', copy.deepcopy(settings))]
+            self.version += 1
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Gộp nhiều lần ghi liên tiếp thành một lần ghi sau flush_delay giây."""
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """Ghi ngay các thay đổi đang chờ xuống đĩa."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            with _file_lock(self.path):
+                if self._file_stat() != self._stat_key:
+                    # Tiến trình khác đã ghi file: áp các thay đổi của mình lên nội dung mới nhất
+                    data = self._read_file()
+                    for change in self._pending:
+                        if change[0] == 'replace':
+                            data = copy.deepcopy(change[1])
+                        else:
+                            _, section, key, value = change
+                            data.setdefault(section, {})[key] = value
+                    self._data = data
+                    self.version += 1
+                self._write_atomic(self._data)
+                self._stat_key = self._file_stat()
+            self._pending = []
+            self._dirty = False
+
+    def _write_atomic(self, settings):
+        """Ghi ra file tạm cùng thư mục rồi rename, tránh để lại file bị cắt dở."""
+        with atomic_write(self.path, 'w', prefix='.settings-', encoding='utf-8') as file:
+            json.dump(settings, file, ensure_ascii=False, indent=4)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """Lấy SettingsStore dùng chung cho một đường dẫn file."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SettingsStore(path)
+        return store
+
+
+@atexit.register
+def _flush_all():
+    """Ghi nốt các thay đổi còn chờ khi thoát chương trình."""
+    for store in list(_stores.values()):
+        try:
+            store.flush()
+        except Exception as e:
+            print(f"Lỗi khi ghi cấu hình: {e}")
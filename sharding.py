@@ -0,0 +1,128 @@
+import bisect
+import glob
+import hashlib
+import os
+import threading
+import time
+
+from settings_store import get_store
+
+# Constants
+SHARD_NAME = os.environ.get('BOT_SHARD')  # Tên tài khoản khi được chạy bởi supervisor.py, None khi chạy một mình
+SHARD_DIR = 'shards'  # Thư mục trạng thái dùng chung giữa supervisor và các tài khoản
+HASH_REPLICAS = 64  # Số điểm ảo của mỗi tài khoản trên vòng băm
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TIMEOUT = 20  # Quá 20 giây không báo là tài khoản đã chết
+GROUPS_REFRESH_INTERVAL = 60  # Chu kỳ báo lại danh sách nhóm tài khoản đang ở
+
+
+def set_shard(name):
+    """Đặt tên tài khoản cho tiến trình này; supervisor.py gọi trước khi nạp script bot vì SHARD_NAME đã được đọc lúc import."""
+    global SHARD_NAME
+    SHARD_NAME = name or None
+    if name:
+        os.environ['BOT_SHARD'] = name
+    else:
+        os.environ.pop('BOT_SHARD', None)
+
+
+def shard_file(path):
+    """Tên file riêng cho tài khoản hiện tại: 'members.snapshot' -> 'members.acc1.snapshot'."""
+    if not SHARD_NAME or not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}.{SHARD_NAME}{ext}'
+
+
+def shard_peers(path, name=None):
+    """Các file cùng loại của mọi tài khoản: 'verdict_cache.acc1.jsonl' -> verdict_cache.*.jsonl."""
+    name = name or SHARD_NAME
+    root, ext = os.path.splitext(path)
+    if name and root.endswith(f'.{name}'):
+        root = root[:-len(name) - 1]
+    return glob.glob(f'{root}.*{ext}')
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Vòng băm nhất quán: thêm/bớt một tài khoản chỉ chuyển các nhóm của phần vòng liên quan."""
+
+    def __init__(self, nodes=(), replicas=HASH_REPLICAS):
+        self.replicas = replicas
+        self._points = []  # (vị trí, tài khoản) đã sắp xếp
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.replicas):
+            bisect.insort(self._points, (_hash(f'{node}#{i}'), node))
+
+    def remove(self, node):
+        self._points = [point for point in self._points if point[1] != node]
+
+    def nodes_for(self, key):
+        """Các tài khoản theo thứ tự ưu tiên cho key: tài khoản đầu tiên theo chiều kim đồng hồ, rồi các tài khoản kế tiếp."""
+        if not self._points:
+            return
+        seen = set()
+        start = bisect.bisect(self._points, (_hash(key), ''))
+        for i in range(len(self._points)):
+            node = self._points[(start + i) % len(self._points)][1]
+            if node not in seen:
+                seen.add(node)
+                yield node
+
+    def assign(self, key, eligible=None):
+        """Tài khoản sở hữu key; eligible(node) lọc tài khoản có thể nhận (ví dụ có ở trong nhóm)."""
+        for node in self.nodes_for(key):
+            if eligible is None or eligible(node):
+                return node
+        return None
+
+
+class ShardClient:
+    """Phía tài khoản: báo nhịp tim và danh sách nhóm cho supervisor, nhận tập nhóm được chia và áp vào bot."""
+
+    def __init__(self, name, bot, shard_dir=SHARD_DIR, verdict_cache=None, interval=HEARTBEAT_INTERVAL):
+        self.name = name
+        self.bot = bot
+        self.verdict_cache = verdict_cache
+        self.interval = interval
+        os.makedirs(shard_dir, exist_ok=True)
+        self.status = get_store(os.path.join(shard_dir, f'{name}.json'))
+        self.assignments = get_store(os.path.join(shard_dir, 'assignments.json'))
+        self._groups_reported = 0.0
+        self._assignment_version = None
+
+    def start(self):
+        thread = threading.Thread(target=self._loop, name='shard-client', daemon=True)
+        thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Lỗi khi đồng bộ phân nhóm: {e}")
+            time.sleep(self.interval)
+
+    def sync(self):
+        """Một lượt: báo trạng thái, nhận phân nhóm mới, nạp cache kiểm duyệt của tài khoản khác."""
+        now = time.time()
+        if now - self._groups_reported >= GROUPS_REFRESH_INTERVAL:
+            self.status.set('status', 'groups', sorted(self.bot.discover_groups()))
+            self._groups_reported = now
+        self.status.set('status', 'heartbeat', now)
+        self.status.set('status', 'pid', os.getpid())
+
+        version = self.assignments.current_version()
+        if version != self._assignment_version:
+            self._assignment_version = version
+            owned = {thread_id for thread_id, owner in self.assignments.items('owners') if owner == self.name}
+            self.bot.set_owned_groups(owned)
+
+        if self.verdict_cache is not None and self.verdict_cache.path:
+            self.verdict_cache.merge_from(shard_peers(self.verdict_cache.path, self.name))
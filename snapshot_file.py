@@ -0,0 +1,145 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from member_snapshot import MemberSnapshot
+from persistence import atomic_write, start_autosave
+
+# Constants
+SNAPSHOT_MAGIC = b'ZLMSNAP1'
+SNAPSHOT_INTERVAL = 60  # Số giây giữa hai lần lưu snapshot thành viên
+
+# Đầu file: magic, số nhóm, độ dài và crc32 của bảng chỉ mục
+_HEADER = struct.Struct('<8sIII')
+# Mỗi mục chỉ mục: độ dài thread_id, độ dài tên, tổng thành viên, vị trí dữ liệu, số thành viên, crc32 dữ liệu
+_ENTRY = struct.Struct('<HHIQII')
+
+
+def _align(offset):
+    """Làm tròn lên bội số của 8 để mảng uint64 có thể đọc thẳng từ mmap."""
+    return (offset + 7) & ~7
+
+
+def _le_bytes(values):
+    """Dữ liệu mảng 'Q' dạng little-endian."""
+    if sys.byteorder == 'big':
+        values = array('Q', values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(block):
+    """Đọc mảng 'Q' little-endian từ một vùng bộ nhớ."""
+    values = array('Q')
+    values.frombytes(block)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class SnapshotFile:
+    """Lưu/đọc snapshot thành viên của các nhóm trong một file nhị phân.
+
+    Dữ liệu mỗi nhóm là hai mảng uint64 (memberId, phiên bản) căn lề 8 byte, có crc32 riêng;
+    nhóm hỏng crc bị bỏ qua và sẽ được tải lại từ Zalo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._saved = {}  # thread_id -> MemberSnapshot đã ghi ở lần lưu trước
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Đọc snapshot, trả về {thread_id: thông tin nhóm} theo dạng của group_info_cache."""
+        try:
+            with open(self.path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size < _HEADER.size:
+                    return {}
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    groups = self._read(mapped)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Lỗi khi đọc snapshot thành viên: {e}")
+            return {}
+        self._saved = {thread_id: info['members'] for thread_id, info in groups.items()}
+        return groups
+
+    def _read(self, mapped):
+        """Đọc bảng chỉ mục và dữ liệu từng nhóm, kiểm tra crc32."""
+        magic, count, index_length, index_crc = _HEADER.unpack_from(mapped, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("sai định dạng file")
+        index_end = _HEADER.size + index_length
+        if zlib.crc32(mapped[_HEADER.size:index_end]) != index_crc:
+            raise ValueError("bảng chỉ mục hỏng")
+
+        groups = {}
+        position = _HEADER.size
+        with memoryview(mapped) as view:
+            for _ in range(count):
+                id_length, name_length, total_member, offset, members, crc = _ENTRY.unpack_from(mapped, position)
+                position += _ENTRY.size
+                thread_id = bytes(view[position:position + id_length]).decode('utf-8')
+                position += id_length
+                name = bytes(view[position:position + name_length]).decode('utf-8')
+                position += name_length
+
+                size = members * 8
+                with view[offset:offset + 2 * size] as block:
+                    if len(block) != 2 * size or zlib.crc32(block) != crc:
+                        print(f"Bỏ qua snapshot hỏng của nhóm {thread_id}")
+                        continue
+                    with block[:size] as ids, block[size:] as versions:
+                        snapshot = MemberSnapshot(_from_le(ids), _from_le(versions), None)
+                groups[thread_id] = {
+                    'name': name,
+                    'members': snapshot,
+                    'total_member': total_member,
+                    'restored': True
+                }
+        return groups
+
+    def save(self, group_info_cache):
+        """Ghi snapshot của mọi nhóm ra file tạm rồi rename; bỏ qua nếu không nhóm nào thay đổi."""
+        with self._lock:
+            groups = list(group_info_cache.items())
+            members = {thread_id: info['members'] for thread_id, info in groups}
+            if members.keys() == self._saved.keys() and all(members[t] is self._saved[t] for t in members):
+                return
+            try:
+                self._write(groups)
+            except OSError as e:
+                print(f"Lỗi khi ghi snapshot thành viên: {e}")
+                return
+            self._saved = members
+
+    def _write(self, groups):
+        """Ghi đầu file, bảng chỉ mục rồi dữ liệu của từng nhóm."""
+        index, blocks = [], []
+        names = [(thread_id.encode('utf-8'), info['name'].encode('utf-8')[:0xffff], info) for thread_id, info in groups]
+        index_length = sum(_ENTRY.size + len(tid) + len(name) for tid, name, _ in names)
+        offset = _align(_HEADER.size + index_length)
+        for tid, name, info in names:
+            snapshot = info['members']
+            block = _le_bytes(snapshot.ids) + _le_bytes(snapshot.versions)
+            index.append(_ENTRY.pack(len(tid), len(name), info['total_member'], offset, len(snapshot), zlib.crc32(block)))
+            index.append(tid + name)
+            blocks.append((offset, block))
+            offset = _align(offset + len(block))
+        index = b''.join(index)
+
+        with atomic_write(self.path, prefix='.members-') as file:
+            file.write(_HEADER.pack(SNAPSHOT_MAGIC, len(names), len(index), zlib.crc32(index)))
+            file.write(index)
+            for offset, block in blocks:
+                file.seek(offset)
+                file.write(block)
+
+    def start_autosave(self, group_info_cache, interval=SNAPSHOT_INTERVAL):
+        """Định kỳ lưu snapshot và lưu lần cuối khi thoát."""
+        start_autosave(lambda: self.save(group_info_cache), interval, 'snapshot-autosave')
@@ -0,0 +1,562 @@
+"""Trạng thái bền vững của bot trong một file SQLite (WAL): cấu hình theo nhóm, snapshot thành viên và nhật ký kiểm duyệt.
+
+Mọi lệnh ghi đi qua một luồng ghi duy nhất, gom thành lô trong một transaction, nên luồng listener
+chỉ đặt việc vào hàng đợi. Đọc dùng kết nối riêng của từng luồng và không bị luồng ghi chặn (WAL).
+Nhiều tiến trình (supervisor.py) dùng chung một file được.
+
+    python state_db.py migrate settings.json --snapshot members.snapshot
+    python state_db.py group <thread_id> --limit 50
+    python state_db.py author <author_id>
+    python state_db.py why "nội dung tin nhắn đã bị xóa"
+    python state_db.py stats --hours 24
+"""
+import argparse
+import atexit
+import copy
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+from snapshot_file import SNAPSHOT_INTERVAL, SnapshotFile, _from_le, _le_bytes
+from member_snapshot import MemberSnapshot
+from persistence import start_autosave
+from verdict_cache import canonical
+
+# Constants
+STATE_DB_FILE = 'bot.db'
+SCHEMA_VERSION = 2  # 2: thêm cột crc vào member_snapshots
+WRITE_QUEUE_SIZE = 50000  # Hàng đợi ghi đầy thì bỏ bản ghi nhật ký thay vì chặn listener
+WRITE_BATCH_SIZE = 500  # Số việc ghi tối đa trong một transaction
+BUSY_TIMEOUT = 10  # Giây chờ khi tiến trình khác đang giữ khóa ghi
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (section, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS member_snapshots (
+    account TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    total_member INTEGER NOT NULL,
+    ids BLOB NOT NULL,
+    versions BLOB NOT NULL,
+    updated REAL NOT NULL,
+    crc INTEGER,  -- crc32 của ids + versions, NULL với bản ghi từ phiên bản 1
+    PRIMARY KEY (account, thread_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS moderation_log (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    thread_id TEXT NOT NULL,
+    author_id TEXT,
+    message_hash TEXT,
+    rule TEXT NOT NULL,
+    detail TEXT,
+    verdict TEXT,
+    action TEXT NOT NULL,
+    decision_ms REAL,
+    action_ms REAL,
+    account TEXT
+);
+CREATE INDEX IF NOT EXISTS moderation_log_thread ON moderation_log (thread_id, ts);
+CREATE INDEX IF NOT EXISTS moderation_log_author ON moderation_log (author_id, ts);
+CREATE INDEX IF NOT EXISTS moderation_log_hash ON moderation_log (message_hash);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+_AUDIT_COLUMNS = ('id', 'ts', 'thread_id', 'author_id', 'message_hash', 'rule', 'detail', 'verdict', 'action',
+                  'decision_ms', 'action_ms', 'account')
+_DELETED = object()  # Đánh dấu khóa cấu hình đang chờ xóa
+
+
+def message_hash(text):
+    """Mã băm của tin nhắn theo dạng chuẩn của verdict_cache: các bản chỉ khác số/dấu câu có cùng mã."""
+    if not isinstance(text, str):
+        return None
+    return hashlib.sha1(canonical(text).encode('utf-8')).hexdigest()[:16]
+
+
+def _migrate_schema(conn):
+    """Nâng file tạo bởi phiên bản schema cũ (CREATE TABLE IF NOT EXISTS không thêm cột mới)."""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(member_snapshots)')}
+    if 'crc' not in columns:
+        try:
+            conn.execute('ALTER TABLE member_snapshots ADD COLUMN crc INTEGER')
+        except sqlite3.OperationalError:
+            pass  # Tiến trình khác vừa thêm cột
+
+
+class StateDB:
+    """File SQLite dùng chung: một luồng ghi theo lô, mỗi luồng đọc một kết nối riêng.
+
+    account là tài khoản đang chạy (BOT_SHARD) khi nhiều tài khoản dùng chung file.
+    """
+
+    def __init__(self, path=STATE_DB_FILE, account=None, batch_size=WRITE_BATCH_SIZE, queue_size=WRITE_QUEUE_SIZE):
+        self.path = path
+        self.account = account or ''
+        self.batch_size = batch_size
+        self.dropped = 0  # Số việc ghi bị bỏ do hàng đợi đầy
+        self._queue = queue.Queue(queue_size)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        conn = self.connect()
+        try:
+            conn.executescript(SCHEMA)
+            _migrate_schema(conn)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        finally:
+            conn.close()
+        atexit.register(self.close)
+
+    def connect(self):
+        """Kết nối mới tới file, chế độ WAL, tự commit từng lệnh."""
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # Đọc
+    def query(self, sql, params=()):
+        """Chạy câu SELECT trên kết nối của luồng hiện tại."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn.execute(sql, params).fetchall()
+
+    def meta(self, key, default=None):
+        rows = self.query('SELECT value FROM meta WHERE key = ?', (key,))
+        return rows[0][0] if rows else default
+
+    # Ghi
+    def write(self, statements, on_commit=None, block=False):
+        """Xếp hàng một nhóm lệnh [(sql, params), ...] được ghi trong cùng một transaction.
+
+        on_commit() được gọi ở luồng ghi sau khi commit. Trả về False nếu hàng đợi đầy và block=False.
+        """
+        self._ensure_writer()
+        try:
+            self._queue.put((statements, on_commit), block=block)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_writer(self):
+        """Chỉ chạy luồng ghi ở lần ghi đầu tiên."""
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name='state-db-writer', daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        """Luồng ghi: lấy một lô việc, ghi trong một transaction, gọi on_commit rồi báo xong."""
+        conn = self.connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Đóng sau khi ghi xong lô này
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            try:
+                self._commit(conn, batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    def _commit(self, conn, batch):
+        """Ghi cả lô trong một transaction; nếu lỗi thì ghi lại từng việc để một việc hỏng không làm mất cả lô."""
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for statements, _ in batch:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+            conn.execute('COMMIT')
+            committed = batch
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            if len(batch) == 1:
+                print(f"Lỗi khi ghi cơ sở dữ liệu: {e}")
+                return
+            committed = []
+            for item in batch:
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    for sql, params in item[0]:
+                        conn.execute(sql, params)
+                    conn.execute('COMMIT')
+                    committed.append(item)
+                except sqlite3.Error as item_error:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    print(f"Lỗi khi ghi cơ sở dữ liệu: {item_error}")
+        for _, on_commit in committed:
+            if on_commit is not None:
+                try:
+                    on_commit()
+                except Exception as e:
+                    print(f"Lỗi sau khi ghi cơ sở dữ liệu: {e}")
+
+    def flush(self):
+        """Chờ mọi việc ghi đang xếp hàng được commit."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        """Ghi nốt hàng đợi rồi dừng luồng ghi."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(BUSY_TIMEOUT)
+
+    # Nhật ký kiểm duyệt
+    def audit(self, thread_id, author_id, rule, action, message=None, detail=None, verdict=None,
+              decision_ms=None, action_ms=None):
+        """Ghi một quyết định kiểm duyệt; chỉ lưu mã băm của tin nhắn, không lưu nội dung."""
+        if isinstance(verdict, bool):
+            verdict = 'yes' if verdict else 'no'
+        row = (time.time(), str(thread_id), author_id and str(author_id), message_hash(message), rule,
+               detail, verdict, action, decision_ms, action_ms, self.account)
+        return self.write([(
+            'INSERT INTO moderation_log (ts, thread_id, author_id, message_hash, rule, detail, verdict, action, '
+            'decision_ms, action_ms, account) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row
+        )])
+
+    def _audit_rows(self, where, params, limit):
+        rows = self.query(f'SELECT {", ".join(_AUDIT_COLUMNS)} FROM moderation_log WHERE {where} '
+                          f'ORDER BY ts DESC LIMIT ?', (*params, limit))
+        return [dict(zip(_AUDIT_COLUMNS, row)) for row in rows]
+
+    def group_history(self, thread_id, limit=50, since=None):
+        """Các quyết định kiểm duyệt gần nhất trong một nhóm (chỉ mục thread_id, ts)."""
+        return self._audit_rows('thread_id = ? AND ts >= ?', (str(thread_id), since or 0), limit)
+
+    def author_history(self, author_id, limit=50, since=None, thread_id=None):
+        """Các quyết định kiểm duyệt gần nhất với một người gửi, có thể lọc theo nhóm."""
+        if thread_id is not None:
+            return self._audit_rows('author_id = ? AND ts >= ? AND thread_id = ?',
+                                    (str(author_id), since or 0, str(thread_id)), limit)
+        return self._audit_rows('author_id = ? AND ts >= ?', (str(author_id), since or 0), limit)
+
+    def why(self, message, limit=20):
+        """Vì sao tin nhắn này (hoặc bản gần giống chỉ khác số/dấu câu) bị xử lý."""
+        return self._audit_rows('message_hash = ?', (message_hash(message),), limit)
+
+    def rule_stats(self, since=None):
+        """Số lần và độ trễ trung bình theo (luật, kết quả, hành động) kể từ since."""
+        rows = self.query(
+            'SELECT rule, verdict, action, COUNT(*), AVG(decision_ms), AVG(action_ms) FROM moderation_log '
+            'WHERE ts >= ? GROUP BY rule, verdict, action ORDER BY COUNT(*) DESC', (since or 0,))
+        return [dict(zip(('rule', 'verdict', 'action', 'count', 'avg_decision_ms', 'avg_action_ms'), row))
+                for row in rows]
+
+    # Bảng cấu hình và snapshot
+    def settings(self, migrate_from=None):
+        """SettingsTable trên file này; lần đầu chạy thì nhập cấu hình cũ từ file JSON migrate_from."""
+        if migrate_from and self.meta('settings_migrated') is None:
+            if os.path.exists(migrate_from):
+                print(f"📦 Đã nhập {migrate_settings(self, migrate_from)} mục cấu hình từ {migrate_from}")
+            self.write([('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                         ('settings_migrated', migrate_from))], block=True)
+            self.flush()
+        return SettingsTable(self)
+
+    def snapshots(self, migrate_from=None):
+        """SnapshotTable của tài khoản đang chạy; lần đầu chạy thì nhập snapshot cũ từ file migrate_from."""
+        table = SnapshotTable(self, self.account)
+        flag = f'snapshots_migrated:{table.account}'
+        if migrate_from and self.meta(flag) is None:
+            if os.path.exists(migrate_from):
+                groups = SnapshotFile(migrate_from).load()
+                table.save(groups)
+                print(f"📦 Đã nhập snapshot {len(groups)} nhóm từ {migrate_from}")
+            self.write([('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (flag, migrate_from))], block=True)
+            self.flush()
+        return table
+
+
+class SettingsTable:
+    """Cấu hình theo nhóm trong bảng settings, dùng thay SettingsStore (cùng các hàm get/items/set/replace).
+
+    Đọc từ bản trong bộ nhớ; thay đổi của tiến trình khác được nhận ra qua PRAGMA data_version.
+    Mỗi lần set() chỉ ghi đúng một dòng thay vì ghi lại cả file.
+    """
+
+    def __init__(self, db, check_interval=1.0):
+        self.db = db
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # Giữ thứ tự ghi giống thứ tự thay đổi trong bộ nhớ
+        self._conn = db.connect()  # Kết nối riêng để theo dõi data_version
+        self._data = {}
+        self.version = 0
+        self._pending = {}  # (section, key) -> (token, giá trị) chưa được commit
+        self._data_version = None
+        self._last_check = 0.0
+        self._load()
+
+    def _load(self):
+        """Nạp lại toàn bộ bảng, giữ các thay đổi của mình chưa được commit."""
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        data = {}
+        for section, key, value in self._conn.execute('SELECT section, key, value FROM settings'):
+            data.setdefault(section, {})[key] = json.loads(value)
+        for (section, key), (_, value) in self._pending.items():
+            if value is _DELETED:
+                data.get(section, {}).pop(key, None)
+            else:
+                data.setdefault(section, {})[key] = value
+        self._data = data
+        self.version += 1
+
+    def _refresh(self):
+        """Kiểm tra theo chu kỳ và nạp lại nếu có kết nối khác đã ghi."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self._conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+            self._load()
+
+    # Truy vấn
+    def snapshot(self):
+        """Trả về bản sao toàn bộ cấu hình."""
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._data)
+
+    def get(self, section, key, default=None):
+        """Lấy giá trị settings[section][key] từ bộ nhớ."""
+        with self._lock:
+            self._refresh()
+            return self._data.get(section, {}).get(key, default)
+
+    def items(self, section):
+        """Lấy danh sách (key, value) của một mục cấu hình."""
+        with self._lock:
+            self._refresh()
+            return list(self._data.get(section, {}).items())
+
+    def current_version(self):
+        """Trả về phiên bản cấu hình hiện tại, nạp lại trước nếu bảng đã thay đổi."""
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    # Ghi
+    def set(self, section, key, value):
+        """Gán settings[section][key] và xếp hàng ghi một dòng."""
+        with self._write_lock:
+            with self._lock:
+                self._refresh()
+                value = copy.deepcopy(value)
+                self._data.setdefault(section, {})[key] = value
+                self.version += 1
+                on_commit = self._track({(section, key): value})
+            statement = ('INSERT OR REPLACE INTO settings (section, key, value, updated) VALUES (?, ?, ?, ?)',
+                         (section, str(key), json.dumps(value, ensure_ascii=False), time.time()))
+            # Cấu hình không được phép mất: chờ nếu hàng đợi ghi đang đầy
+            self.db.write([statement], on_commit, block=True)
+
+    def replace(self, settings):
+        """Thay toàn bộ cấu hình: ghi các dòng mới và xóa các dòng không còn, trong cùng một transaction."""
+        with self._write_lock:
+            settings = copy.deepcopy(settings)
+            statements = [('DELETE FROM settings', ())]
+            now = time.time()
+            for section, values in settings.items():
+                for key, value in values.items():
+                    statements.append(('INSERT INTO settings (section, key, value, updated) VALUES (?, ?, ?, ?)',
+                                       (section, str(key), json.dumps(value, ensure_ascii=False), now)))
+            with self._lock:
+                changes = {(section, key): _DELETED for section, values in self._data.items() for key in values}
+                changes.update(((section, key), value) for section, values in settings.items() for key, value in values.items())
+                self._data = settings
+                self.version += 1
+                on_commit = self._track(changes)
+            self.db.write(statements, on_commit, block=True)
+
+    def _track(self, changes):
+        """Ghi nhớ các thay đổi chưa commit để lần nạp lại không làm mất chúng, trả về hàm gọi khi đã commit."""
+        token = object()
+        for change_key, value in changes.items():
+            self._pending[change_key] = (token, value)
+
+        def on_commit():
+            with self._lock:
+                for change_key in changes:
+                    if self._pending.get(change_key, (None,))[0] is token:
+                        del self._pending[change_key]
+
+        return on_commit
+
+    def flush(self):
+        """Chờ các thay đổi đang chờ được ghi xuống đĩa."""
+        self.db.flush()
+
+
+class SnapshotTable:
+    """Snapshot thành viên trong bảng member_snapshots, dùng thay SnapshotFile (cùng các hàm load/save/start_autosave).
+
+    Mỗi lần lưu chỉ ghi các nhóm có danh sách thành viên đổi từ lần trước. Như SnapshotFile, dữ liệu mỗi nhóm
+    có crc32 riêng; nhóm hỏng crc bị bỏ qua và sẽ được tải lại từ Zalo.
+    """
+
+    def __init__(self, db, account=None):
+        self.db = db
+        self.account = account or ''
+        self._saved = {}  # thread_id -> MemberSnapshot đã ghi ở lần lưu trước
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Đọc snapshot, trả về {thread_id: thông tin nhóm} theo dạng của group_info_cache."""
+        groups = {}
+        try:
+            rows = self.db.query('SELECT thread_id, name, total_member, ids, versions, crc FROM member_snapshots '
+                                 'WHERE account = ?', (self.account,))
+        except sqlite3.Error as e:
+            print(f"Lỗi khi đọc snapshot thành viên: {e}")
+            return {}
+        for thread_id, name, total_member, ids, versions, crc in rows:
+            if len(ids) != len(versions) or len(ids) % 8 or (crc is not None and zlib.crc32(ids + versions) != crc):
+                print(f"Bỏ qua snapshot hỏng của nhóm {thread_id}")
+                continue
+            groups[thread_id] = {
+                'name': name,
+                'members': MemberSnapshot(_from_le(ids), _from_le(versions), None),
+                'total_member': total_member,
+                'restored': True
+            }
+        with self._lock:
+            self._saved = {thread_id: info['members'] for thread_id, info in groups.items()}
+        return groups
+
+    def save(self, group_info_cache):
+        """Xếp hàng ghi các nhóm thay đổi và xóa các nhóm không còn trong cache."""
+        with self._lock:
+            groups = list(group_info_cache.items())
+            members = {thread_id: info['members'] for thread_id, info in groups}
+            now = time.time()
+            statements = []
+            for thread_id, info in groups:
+                if self._saved.get(thread_id) is info['members']:
+                    continue
+                ids, versions = _le_bytes(info['members'].ids), _le_bytes(info['members'].versions)
+                statements.append((
+                    'INSERT OR REPLACE INTO member_snapshots (account, thread_id, name, total_member, ids, versions, '
+                    'updated, crc) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (self.account, thread_id, info['name'], info['total_member'], ids, versions, now,
+                     zlib.crc32(ids + versions))
+                ))
+            statements.extend(('DELETE FROM member_snapshots WHERE account = ? AND thread_id = ?', (self.account, thread_id))
+                              for thread_id in self._saved.keys() - members.keys())
+            if statements:
+                self.db.write(statements, block=True)
+            self._saved = members
+
+    def start_autosave(self, group_info_cache, interval=SNAPSHOT_INTERVAL):
+        """Định kỳ lưu snapshot và lưu lần cuối khi thoát (trước khi luồng ghi dừng)."""
+        start_autosave(lambda: self.save(group_info_cache), interval, 'snapshot-autosave')
+
+
+def migrate_settings(db, path):
+    """Nhập các mục cấu hình từ settings.json cũ vào bảng settings, trả về số mục đã nhập."""
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    statements, now = [], time.time()
+    for section, values in data.items():
+        if not isinstance(values, dict):
+            print(f"Bỏ qua mục cấu hình {section}: không phải dạng {{khóa: giá trị}}")
+            continue
+        for key, value in values.items():
+            statements.append(('INSERT OR REPLACE INTO settings (section, key, value, updated) VALUES (?, ?, ?, ?)',
+                               (section, str(key), json.dumps(value, ensure_ascii=False), now)))
+    db.write(statements, block=True)
+    db.flush()
+    return len(statements)
+
+
+def _format_rows(rows):
+    lines = []
+    for row in rows:
+        ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['ts']))
+        latency = ' '.join(f'{name}={row[name]:.1f}ms' for name in ('decision_ms', 'action_ms') if row[name] is not None)
+        lines.append(f"{ts} nhóm={row['thread_id']} người={row['author_id']} luật={row['rule']} "
+                     f"kết_quả={row['verdict'] or '-'} {row['action']} {row['detail'] or ''} {latency}".rstrip())
+    return '\n'.join(lines) or 'Không có bản ghi'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tra cứu và nhập dữ liệu cho bot.db')
+    parser.add_argument('--db', default=STATE_DB_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate = commands.add_parser('migrate', help='nhập settings.json (và snapshot thành viên) cũ')
+    migrate.add_argument('settings', nargs='?', default='settings.json')
+    migrate.add_argument('--snapshot', help='file snapshot thành viên, ví dụ members.snapshot')
+    migrate.add_argument('--account', default='', help='tài khoản của snapshot khi chạy nhiều tài khoản')
+    group = commands.add_parser('group', help='lịch sử kiểm duyệt của một nhóm')
+    group.add_argument('thread_id')
+    author = commands.add_parser('author', help='lịch sử kiểm duyệt của một người gửi')
+    author.add_argument('author_id')
+    author.add_argument('--group')
+    why = commands.add_parser('why', help='vì sao một tin nhắn bị xử lý')
+    why.add_argument('message')
+    stats = commands.add_parser('stats', help='thống kê theo luật')
+    stats.add_argument('--hours', type=float, default=24)
+    for command in (group, author, why):
+        command.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    db = StateDB(args.db)
+    if args.command == 'migrate':
+        print(f"Đã nhập {migrate_settings(db, args.settings)} mục cấu hình từ {args.settings}")
+        if args.snapshot:
+            groups = SnapshotFile(args.snapshot).load()
+            SnapshotTable(db, args.account).save(groups)
+            db.flush()
+            print(f"Đã nhập snapshot {len(groups)} nhóm từ {args.snapshot}")
+    elif args.command == 'group':
+        print(_format_rows(db.group_history(args.thread_id, args.limit)))
+    elif args.command == 'author':
+        print(_format_rows(db.author_history(args.author_id, args.limit, thread_id=args.group)))
+    elif args.command == 'why':
+        print(_format_rows(db.why(args.message, args.limit)))
+    else:
+        print(f"{'luật':<10}{'kết quả':<10}{'hành động':<16}{'số lần':>8}{'quyết định ms':>15}{'xóa ms':>10}")
+        for row in db.rule_stats(time.time() - args.hours * 3600):
+            decision = f"{row['avg_decision_ms']:.1f}" if row['avg_decision_ms'] is not None else '-'
+            action = f"{row['avg_action_ms']:.1f}" if row['avg_action_ms'] is not None else '-'
+            print(f"{row['rule']:<10}{row['verdict'] or '-':<10}{row['action']:<16}{row['count']:>8}{decision:>15}{action:>10}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
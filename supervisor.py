@@ -0,0 +1,161 @@
+"""Chạy nhiều tài khoản Zalo, mỗi tài khoản một tiến trình, và chia nhóm giữa chúng bằng vòng băm nhất quán.
+
+File cấu hình (đọc lại khi thay đổi, thêm/bớt tài khoản không cần khởi động lại):
+
+    {
+        "script": "update.py",
+        "accounts": {
+            "acc1": {"imei": "...", "session_cookies": {...}, "metrics_port": 9108},
+            "acc2": {"imei": "...", "session_cookies": {...}}
+        }
+    }
+
+    python supervisor.py --config accounts.json
+
+Mỗi nhóm chỉ do đúng một tài khoản đang sống và có mặt trong nhóm xử lý (chào, kiểm duyệt, quét
+thành viên). Tài khoản chết (không báo nhịp tim quá HEARTBEAT_TIMEOUT giây) thì các nhóm của nó
+được chia lại cho tài khoản kế tiếp trên vòng.
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import sys
+import time
+
+from settings_store import get_store
+from sharding import HEARTBEAT_TIMEOUT, SHARD_DIR, HashRing, ShardClient, set_shard
+
+# Constants
+CONFIG_FILE = 'accounts.json'
+CHECK_INTERVAL = 2
+RESTART_BACKOFF = (1, 5, 15, 60)  # Giây chờ trước lần khởi động lại thứ 1, 2, 3, 4+
+
+
+def _load_script(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_worker(name, script, account, shard_dir=SHARD_DIR):
+    """Tiến trình con của một tài khoản: nạp script bot với BOT_SHARD=name rồi lắng nghe như khi chạy một mình."""
+    # sharding đã được import (khi giải tuần tự hoá run_worker) trước khi có BOT_SHARD, phải đặt lại tên
+    set_shard(name)
+    module = _load_script(script, 'bot_worker')
+    port = account.get('metrics_port')
+    if port and hasattr(module, 'start_metrics_server'):
+        module.start_metrics_server(port)
+    bot = module.Bot(account.get('api_key', 'api_key'), account.get('secret_key', 'secret_key'),
+                     imei=account['imei'], session_cookies=account['session_cookies'])
+    ShardClient(name, bot, shard_dir, verdict_cache=getattr(module, 'verdict_cache', None)).start()
+    bot.listen(run_forever=True, delay=0, thread=True, type='requests')
+
+
+class Supervisor:
+    """Giữ cho mỗi tài khoản trong cấu hình có một tiến trình sống và ghi bảng phân nhóm vào shards/assignments.json."""
+
+    def __init__(self, config_path=CONFIG_FILE, shard_dir=SHARD_DIR, check_interval=CHECK_INTERVAL):
+        self.config = get_store(config_path)
+        self.shard_dir = shard_dir
+        self.check_interval = check_interval
+        os.makedirs(shard_dir, exist_ok=True)
+        self.assignments = get_store(os.path.join(shard_dir, 'assignments.json'))
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = {}  # name -> {'process', 'account', 'restarts', 'next_start'}
+
+    def _accounts(self):
+        return {name: account for name, account in self.config.items('accounts')}
+
+    def _start(self, name, account):
+        script = self.config.snapshot().get('script') or 'update.py'
+        process = self.context.Process(target=run_worker, args=(name, script, account, self.shard_dir),
+                                       name=f'bot-{name}', daemon=False)
+        process.start()
+        print(f"Đã chạy tài khoản {name} (pid {process.pid})")
+        return process
+
+    def _stop(self, name):
+        worker = self.workers.pop(name)
+        process = worker['process']
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(10)
+        print(f"Đã dừng tài khoản {name}")
+
+    def check_workers(self):
+        """Khởi động tài khoản mới, khởi động lại tiến trình chết (có giãn cách), dừng tài khoản đã bị xoá."""
+        accounts = self._accounts()
+        now = time.time()
+        for name in list(self.workers):
+            if name not in accounts or accounts[name] != self.workers[name]['account']:
+                self._stop(name)
+        for name, account in accounts.items():
+            worker = self.workers.setdefault(name, {'process': None, 'account': account, 'restarts': 0, 'next_start': 0})
+            process = worker['process']
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                print(f"Tài khoản {name} đã dừng (mã {process.exitcode})")
+                worker['next_start'] = now + RESTART_BACKOFF[min(worker['restarts'], len(RESTART_BACKOFF) - 1)]
+                worker['restarts'] += 1
+                worker['process'] = None
+            if now >= worker['next_start']:
+                try:
+                    worker['process'] = self._start(name, account)
+                except Exception as e:
+                    print(f"Lỗi khi chạy tài khoản {name}: {e}")
+
+    def _alive_groups(self):
+        """{tài khoản: tập nhóm} của các tài khoản có tiến trình sống và nhịp tim còn mới."""
+        now = time.time()
+        alive = {}
+        for name, worker in self.workers.items():
+            process = worker['process']
+            if process is None or not process.is_alive():
+                continue
+            status = get_store(os.path.join(self.shard_dir, f'{name}.json'))
+            if now - status.get('status', 'heartbeat', 0) > HEARTBEAT_TIMEOUT:
+                continue
+            alive[name] = set(status.get('status', 'groups', []))
+        return alive
+
+    def rebalance(self):
+        """Chia lại nhóm: mỗi nhóm thuộc tài khoản đầu tiên trên vòng băm có mặt trong nhóm đó."""
+        groups_of = self._alive_groups()
+        ring = HashRing(groups_of)
+        owners = {}
+        for thread_id in sorted(set().union(*groups_of.values())):
+            owner = ring.assign(thread_id, eligible=lambda name: thread_id in groups_of[name])
+            if owner is not None:
+                owners[thread_id] = owner
+        previous = dict(self.assignments.items('owners'))
+        if owners != previous:
+            moved = sum(1 for thread_id, owner in owners.items() if previous.get(thread_id) != owner)
+            self.assignments.replace({'owners': owners})
+            print(f"Chia lại nhóm: {len(owners)} nhóm cho {len(groups_of)} tài khoản, {moved} nhóm đổi tài khoản")
+
+    def run(self):
+        try:
+            while True:
+                self.check_workers()
+                self.rebalance()
+                time.sleep(self.check_interval)
+        except KeyboardInterrupt:
+            for name in list(self.workers):
+                self._stop(name)
+            self.assignments.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chạy nhiều tài khoản bot và chia nhóm giữa chúng')
+    parser.add_argument('--config', default=CONFIG_FILE)
+    parser.add_argument('--shard-dir', default=SHARD_DIR)
+    args = parser.parse_args()
+    Supervisor(args.config, args.shard_dir).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Kiểm tra KeywordFilter với các kiểu viết né bộ lọc.
+
+Chạy: python -m pytest test_keyword_filter.py
+"""
+import pytest
+
+from keyword_filter import KeywordFilter, normalize
+
+WORDS = ['bán', 'tuyển ctv', 'đặt hàng', 'chốt đơn']
+
+
+class _Store:
+    """Bảng cấu hình tối thiểu: không có mục 'keywords', dùng danh sách mặc định."""
+
+    def get(self, section, key, default=None):
+        return default
+
+    def current_version(self):
+        return 0
+
+
+@pytest.fixture
+def keyword_filter():
+    return KeywordFilter(_Store(), WORDS)
+
+
+@pytest.mark.parametrize('text, keyword', [
+    ('tuyển  ctv gấp', 'tuyển ctv'),
+    ('tuyển\t\nctv', 'tuyển ctv'),
+    ('đ ặ t h à n g ngay', 'đặt hàng'),
+    ('đ.ặ.t h.à.n.g', 'đặt hàng'),
+    ('CHỐT   ĐƠN nha', 'chốt đơn'),
+    ('b á n nhà', 'bán'),
+    ('ｂán hàng', 'bán'),
+])
+def test_matches_evasions(keyword_filter, text, keyword):
+    assert keyword_filter.match('g', text) == keyword
+
+
+@pytest.mark.parametrize('text', [
+    'hôm nay trời đẹp',
+    'ba nhà',
+    'tuyển dụng kế toán',
+])
+def test_ignores_clean_messages(keyword_filter, text):
+    assert keyword_filter.match('g', text) is None
+
+
+def test_normalize_collapses_whitespace():
+    assert normalize('tuyển   ctv\n') == 'tuyển ctv '
@@ -0,0 +1,54 @@
+"""Kiểm tra LinkScanner bắt đúng tập liên kết của regex cũ trong onMessage.
+
+Chạy: python -m pytest test_link_scanner.py
+"""
+import re
+
+import pytest
+
+from link_scanner import LinkScanner
+
+LEGACY_PATTERN = r'(https?:\/\/[^\s]+|www\.[^\s]+|(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,})'
+
+
+@pytest.mark.parametrize('text, link', [
+    ('.shopee.vn', 'shopee.vn'),
+    ('xem...shopee.vn', 'shopee.vn'),
+    ('shopee.vn.1', 'shopee.vn'),
+    ('abc.com.vn2', 'abc.com.vn'),
+    ('giáshopee.vn', 'shopee.vn'),
+    ('Inbox hoặc ghé Shopee.VN nha', 'Shopee.VN'),
+    ('HTTP://1.2.3.4/x', 'HTTP://1.2.3.4/x'),
+    ('Https://localhost:8080/a', 'Https://localhost:8080/a'),
+    ('ghé 1www.abc/x nhé', 'www.abc/x'),
+])
+def test_finds_legacy_links(text, link):
+    assert re.search(LEGACY_PATTERN, text.lower())
+    assert LinkScanner().find(text) == link
+
+
+@pytest.mark.parametrize('text', [
+    'www.',
+    'WWW. ',
+    'Giá vàng hôm nay 7.85 triệu',
+    'a.a.a',
+    'phiên bản 1.2.3',
+    'ok anh em, tối nay 8h họp nhóm nha',
+])
+def test_ignores_non_links(text):
+    assert LinkScanner().find(text) is None
+
+
+def test_allowed_domains():
+    scanner = LinkScanner(['zalo.me'])
+    assert scanner.find('https://zalo.me/g/abc.xyz') is None
+    assert scanner.find('xem tại www.zalo.me') is None
+    assert scanner.find('zalo.me.vn') == 'zalo.me.vn'
+    assert scanner.find('http://www.zalo.me/x', 'ghé shopee.vn') == 'shopee.vn'
+
+
+def test_long_dotted_message_is_fast():
+    # Regex cũ mất hàng trăm ms cho tin này vì quay lui theo bình phương
+    scanner = LinkScanner()
+    for text in ('a.' * 5000, 'a-' * 5000 + '.', ('1' * 50 + '.') * 200 + 'x'):
+        assert scanner.find(text) is None
@@ -1,16 +1,87 @@
-import json
 import os
-import re
+import json
+import logging
 import threading
 import time
-import requests
+from functools import partial
 import openai
 from zlapi import ZaloAPI
 from zlapi.models import Message, ThreadType
+from state_db import StateDB
+from warmup import start_warm_up
+from avatar_cache import avatar_cache
+from welcome_card import CardRenderer, CARD_WIDTH, CARD_HEIGHT
+from profile_cache import profile_cache
+from link_scanner import LinkScanner
+from send_queue import SendScheduler, PRIORITY_MODERATION
+from poll_scheduler import PollScheduler
+from member_snapshot import MemberSnapshot
+from flood_guard import FloodGuard
+from bot_log import setup_logging, get_logger, log_event
+from metrics import metrics, timed, start_metrics_server
+from sharding import SHARD_NAME, shard_file
+from keyword_filter import KeywordFilter
+from verdict_cache import VerdictCache
+from moderation_pool import ModerationPool
+from batch_classifier import BatchClassifier, parse_verdicts
+from local_classifier import LocalClassifier, VerdictLog
 
 # Hằng số
-SETTINGS_FILE = 'settings.json'
+SETTINGS_FILE = 'settings.json'  # Cấu hình dạng file cũ, chỉ dùng để nhập vào bot.db ở lần chạy đầu
+STATE_DB_FILE = 'bot.db'  # Cấu hình theo nhóm, snapshot thành viên và nhật ký kiểm duyệt (SQLite)
+# Tạo trước mọi luồng nền vì các tiến trình vẽ thiệp được fork tại đây (kể cả luồng ghi của bot.db,
+# chạy ngay khi nhập settings.json ở lần đầu); mẫu thiệp theo nhóm đọc từ mục "cards" sau khi có settings_store
+card_renderer = CardRenderer(None, avatar_cache)
+state_db = StateDB(STATE_DB_FILE, account=SHARD_NAME)
+settings_store = state_db.settings(migrate_from=SETTINGS_FILE)
+card_renderer.store = settings_store
+MEMBER_CHECK_MODE = 'version'  # 'version': chỉ tải nhóm có gridVerMap thay đổi, 'adaptive': lịch riêng cho từng nhóm
+MEMBER_CHECK_INTERVAL = 2
+POLL_WORKERS = 4  # Số nhóm được kiểm tra song song ở chế độ 'adaptive'
+WARMUP_WORKERS = 8  # Số nhóm được tải song song khi khởi động
+WARMUP_RETRIES = 2
+SAVE_MEMBER_SNAPSHOTS = True  # Đặt False để không lưu danh sách thành viên
+MEMBER_SNAPSHOT_FILE = shard_file('members.snapshot')  # Snapshot dạng file cũ, chỉ dùng để nhập vào bot.db ở lần chạy đầu
+CATCHUP_LIMIT = 10  # Số người ra/vào tối đa được chào khi bù lại thay đổi lúc bot tắt
+member_snapshots = state_db.snapshots(migrate_from=MEMBER_SNAPSHOT_FILE)
+ALLOWED_LINK_DOMAINS = []  # Tên miền được phép gửi, ví dụ ['zalo.me']
+link_scanner = LinkScanner(ALLOWED_LINK_DOMAINS)
+LOG_FILE = shard_file('bot.log')  # Log JSON lines, xoay vòng theo kích thước
+LOG_LEVEL = 'INFO'  # 'DEBUG' để ghi cả nội dung từng tin nhắn
+LOG_SAMPLING = {'message': 0.1}  # Chỉ ghi 10% bản ghi tin nhắn đến ở mức DEBUG
+setup_logging(LOG_FILE, LOG_LEVEL, sampling=LOG_SAMPLING)
+message_log = get_logger('message')
+moderation_log = get_logger('moderation')
+welcome_log = get_logger('welcome')
+flood_guard = FloodGuard(settings_store)  # Chống spam chỉ bật với nhóm có mục trong "flood" của bảng settings
+OWNER_ID = '2049100404891878006'  # Chủ bot: được dùng lệnh !wl và không bị chặn spam
+METRICS_PORT = 9108  # Số liệu tại http://127.0.0.1:9108/metrics; đặt None để không mở, BOT_METRICS=0 để tắt hẳn
+# Từ khóa mặc định, có thể ghi đè theo nhóm trong mục "keywords" của bảng settings
+BAN_KEYWORDS = [
+    "bán", "shop", "giá", "đặt hàng", "giao hàng", "order", "sale", "ship",
+    "khuyến mãi", "mua", "sỉ lẻ", "bao giá", "chốt đơn", "thanh toán",
+    "săn sale", "combo", "freeship", "deal", "đơn hàng", "tuyển sỉ", "tuyển ctv"
+]
+keyword_filter = KeywordFilter(settings_store, BAN_KEYWORDS)
+VERDICT_CACHE_FILE = shard_file('verdict_cache.jsonl')  # Đặt None để không lưu cache kiểm duyệt xuống đĩa
+verdict_cache = VerdictCache(path=VERDICT_CACHE_FILE)
+metrics.counter('verdict_cache_hits', lambda: verdict_cache.stats()['hits'])
+metrics.counter('verdict_cache_near_hits', lambda: verdict_cache.stats()['near_hits'])
+metrics.counter('verdict_cache_misses', lambda: verdict_cache.stats()['misses'])
+if VERDICT_CACHE_FILE:
+    verdict_cache.start_autosave()
+LOCAL_MODEL_FILE = shard_file('selling_model.bin')  # Mô hình phân loại cục bộ, tự quyết các tin chắc chắn trước khi hỏi GPT
+local_classifier = LocalClassifier(path=LOCAL_MODEL_FILE)
+if LOCAL_MODEL_FILE:
+    local_classifier.load()
+    local_classifier.start_autosave()
+GPT_VERDICT_LOG = shard_file('gpt_verdicts.jsonl')  # Nhật ký kết quả GPT để huấn luyện lại bằng local_classifier.py
+verdict_log = VerdictLog(GPT_VERDICT_LOG)
 openai.api_key = "haha"  # Thay bằng khóa API OpenAI thực tế
+OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE')  # Ví dụ http://127.0.0.1:8001/v1 để chạy với openai_stub.py
+if OPENAI_API_BASE:
+    openai.api_base = OPENAI_API_BASE
+MODERATION_WORKERS = 16  # Nên >= BATCH_MAX_SIZE để các lô được gom đầy
 THONG_TIN_TAC_GIA = (
     "👨‍💻 Tác giả: A Sìn\n"
     "🔄 Cập nhật: 09-10-24 v2\n"
@@ -22,97 +93,170 @@ THONG_TIN_TAC_GIA = (
 
 # Hàm xử lý file
 def read_settings():
-    """Đọc cấu hình từ file JSON, tạo file mới nếu chưa tồn tại."""
-    if not os.path.exists(SETTINGS_FILE):
-        write_settings({})
-    try:
-        with open(SETTINGS_FILE, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    """Bản sao cấu hình đang giữ trong bộ nhớ, chỉ đọc lại từ bot.db khi có tiến trình khác ghi vào."""
+    return settings_store.snapshot()
 
 def write_settings(settings):
-    """Ghi cấu hình vào file JSON với định dạng UTF-8."""
-    with open(SETTINGS_FILE, 'w', encoding='utf-8') as file:
-        json.dump(settings, file, ensure_ascii=False, indent=4)
+    """Thay toàn bộ cấu hình: cập nhật bộ nhớ ngay, bảng settings trong bot.db được ghi lại trong một transaction ở luồng ghi."""
+    settings_store.replace(settings)
 
 # Quản lý chế độ chào đón
 def get_allowed_thread_ids():
     """Lấy danh sách ID nhóm có chế độ chào đón được bật."""
-    settings = read_settings()
-    welcome_settings = settings.get('welcome', {})
-    return [thread_id for thread_id, is_enabled in welcome_settings.items() if is_enabled]
+    return [thread_id for thread_id, is_enabled in settings_store.items('welcome') if is_enabled]
 
 def enable_welcome(thread_id):
     """Bật chế độ chào đón cho nhóm."""
-    settings = read_settings()
-    settings.setdefault('welcome', {})
-    settings['welcome'][thread_id] = True
-    write_settings(settings)
+    settings_store.set('welcome', thread_id, True)
     return "🚦 Chế độ chào đón 🟢 Đã bật 🎉"
 
 def disable_welcome(thread_id):
     """Tắt chế độ chào đón cho nhóm."""
-    settings = read_settings()
-    if 'welcome' in settings and thread_id in settings['welcome']:
-        settings['welcome'][thread_id] = False
-        write_settings(settings)
+    if settings_store.get('welcome', thread_id) is not None:
+        settings_store.set('welcome', thread_id, False)
         return "🚦 Chế độ chào đón 🔴 Đã tắt 🎉"
     return "🚦 Nhóm chưa có cấu hình chào đón để 🔴 Tắt 🤗"
 
 def is_welcome_enabled(thread_id):
     """Kiểm tra xem nhóm có bật chế độ chào đón không."""
-    settings = read_settings()
-    return settings.get('welcome', {}).get(thread_id, False)
+    return settings_store.get('welcome', thread_id, False)
 
 # Quản lý thông tin nhóm
+def cache_group_info(bot, thread_id, group_info, members=None):
+    """Lưu thông tin nhóm vào cache, chỉ giữ danh sách thành viên dạng đã phân tích."""
+    bot.group_info_cache[thread_id] = {
+        'name': group_info['name'],
+        'members': members if members is not None else MemberSnapshot.parse(group_info['memVerList']),
+        'total_member': group_info['totalMember'],
+        'admins': set(group_info.get('adminIds') or []) | {group_info.get('creatorId')}
+    }
+
+def is_moderator(bot, thread_id, author_id):
+    """Chính bot, chủ bot hoặc trưởng/phó nhóm (theo lần tải thông tin nhóm gần nhất)."""
+    if author_id in (bot.uid, OWNER_ID):
+        return True
+    group_info = bot.group_info_cache.get(thread_id)
+    return bool(group_info) and author_id in group_info.get('admins', ())
+
+def load_group_info(bot, thread_id):
+    """Tải thông tin một nhóm vào cache, nhóm sẵn sàng để so sánh ngay khi tải xong."""
+    group_info = bot.fetchGroupInfo(thread_id).gridInfoMap.get(thread_id)
+    if group_info:
+        cache_group_info(bot, thread_id, group_info)
+    else:
+        print(f"Bỏ qua nhóm {thread_id}")
+    bot.warming_up.discard(thread_id)
+
 def initialize_group_info(bot, allowed_thread_ids):
     """Khởi tạo thông tin nhóm từ danh sách ID nhóm."""
-    for thread_id in allowed_thread_ids:
-        group_info = bot.fetchGroupInfo(thread_id).gridInfoMap.get(thread_id)
-        if group_info:
-            bot.group_info_cache[thread_id] = {
-                'name': group_info['name'],
-                'member_list': group_info['memVerList'],
-                'total_member': group_info['totalMember']
-            }
-        else:
-            print(f"Bỏ qua nhóm {thread_id}")
+    bot.warming_up.update(allowed_thread_ids)
+
+    def on_finish(loaded, failed):
+        # Nhóm lỗi sẽ được lấy làm mốc ở lần kiểm tra kế tiếp
+        bot.warming_up.difference_update(failed)
+
+    return start_warm_up(
+        allowed_thread_ids,
+        lambda thread_id: load_group_info(bot, thread_id),
+        on_finish=on_finish,
+        workers=WARMUP_WORKERS,
+        retries=WARMUP_RETRIES
+    )
+
+def restore_group_info(bot, allowed_thread_ids):
+    """Nạp snapshot thành viên đã lưu, trả về danh sách nhóm chưa có snapshot cần tải từ đầu."""
+    if SAVE_MEMBER_SNAPSHOTS:
+        bot.group_info_cache.update(member_snapshots.load())
+    for thread_id in set(bot.group_info_cache) - set(allowed_thread_ids):
+        del bot.group_info_cache[thread_id]
+    for thread_id in bot.group_info_cache:
+        # Lần kiểm tra đầu tiên so sánh với snapshot để bù người ra/vào lúc bot tắt
+        bot.group_versions.pop(thread_id, None)
+    if bot.group_info_cache:
+        print(f"📦 Đã nạp snapshot của {len(bot.group_info_cache)} nhóm")
+    return [thread_id for thread_id in allowed_thread_ids if thread_id not in bot.group_info_cache]
+
+def fetch_changed_groups(bot):
+    """Lấy danh sách nhóm có phiên bản trong gridVerMap thay đổi so với lần kiểm tra trước."""
+    try:
+        ver_map = bot.fetchAllGroups().gridVerMap
+    except Exception as e:
+        print(f"Lỗi khi lấy gridVerMap: {e}")
+        return []
+    changed = [thread_id for thread_id, version in ver_map.items() if bot.group_versions.get(thread_id) != version]
+    bot.group_versions = dict(ver_map)
+    return changed
 
 def check_member_changes(bot, thread_id):
     """Kiểm tra sự thay đổi thành viên trong nhóm."""
     current_group_info = bot.fetchGroupInfo(thread_id).gridInfoMap.get(thread_id)
     cached_group_info = bot.group_info_cache.get(thread_id)
 
-    if not cached_group_info or not current_group_info:
+    if not current_group_info:
+        return [], []
+    if not cached_group_info:
+        # Nhóm mới: lấy làm mốc để so sánh ở lần sau
+        cache_group_info(bot, thread_id, current_group_info)
         return [], []
 
-    old_members = {member.split('_')[0] for member in cached_group_info['member_list']}
-    new_members = {member.split('_')[0] for member in current_group_info['memVerList']}
-
-    joined_members = new_members - old_members
-    left_members = old_members - new_members
+    joined_members, left_members, members = cached_group_info['members'].diff(current_group_info['memVerList'])
+    if cached_group_info.get('restored'):
+        joined_members, left_members = limit_catch_up(thread_id, joined_members, left_members)
 
     # Cập nhật cache
-    bot.group_info_cache[thread_id] = {
-        'name': current_group_info['name'],
-        'member_list': current_group_info['memVerList'],
-        'total_member': current_group_info['totalMember']
-    }
+    cache_group_info(bot, thread_id, current_group_info, members)
 
     return joined_members, left_members
 
-# Hàm tiện ích
-def delete_file(file_path):
-    """Xóa tệp tạm sau khi sử dụng."""
-    try:
-        os.remove(file_path)
-        print(f"Đã xóa tệp: {file_path}")
-    except Exception as e:
-        print(f"Lỗi khi xóa tệp: {e}")
+def limit_catch_up(thread_id, joined_members, left_members):
+    """Giới hạn số người ra/vào được chào khi bù thay đổi lúc bot tắt, tránh spam nhóm sau thời gian dài offline."""
+    skipped = max(0, len(joined_members) - CATCHUP_LIMIT) + max(0, len(left_members) - CATCHUP_LIMIT)
+    if skipped:
+        log_event(welcome_log, 'catch_up_limited', logging.WARNING, thread_id=thread_id, skipped=skipped,
+                  limit=CATCHUP_LIMIT)
+    # Giữ những người cuối danh sách: số thứ tự khi chào được tính ngược từ total_member nên mới khớp vị trí của họ
+    return joined_members[-CATCHUP_LIMIT:], left_members[-CATCHUP_LIMIT:]
 
-def is_selling_context(message: str) -> bool:
-    """Dùng GPT để kiểm tra xem tin nhắn có nội dung buôn bán không."""
+# Hàm tiện ích
+def send_with_avatar(bot, avatar_url, message, message_object, thread_id, thread_type):
+    """Gửi tin nhắn kèm ảnh đại diện đã tải sẵn, gửi chữ nếu chưa có ảnh."""
+    with avatar_cache.staged(avatar_url, download=False) as avatar_path:
+        if avatar_path:
+            bot.sendLocalImage(avatar_path, thread_id, thread_type, message=message, width=240, height=240)
+            return
+    if message_object:
+        bot.replyMessage(message, message_object, thread_id, thread_type)
+    else:
+        bot.send(message, thread_id, thread_type)
+
+def send_card(bot, avatar_url, lines, message, message_object, thread_id, thread_type):
+    """Gửi thiệp vẽ sẵn kèm lời nhắn trong một tin, gửi ảnh đại diện như cũ nếu thiệp chưa vẽ xong."""
+    with card_renderer.staged(thread_id, avatar_url, lines) as card_path:
+        if card_path:
+            bot.sendLocalImage(card_path, thread_id, thread_type, message=message, width=CARD_WIDTH, height=CARD_HEIGHT)
+            return
+    send_with_avatar(bot, avatar_url, message, message_object, thread_id, thread_type)
+
+def welcome_card_lines(member_info, group_name, number):
+    """Nội dung thiệp chào mừng."""
+    return (member_info.displayName, f"đến với {group_name}", f"Thành viên thứ {number}")
+
+def goodbye_card_lines(member_info, group_name, total_member):
+    """Nội dung thiệp tạm biệt."""
+    return (member_info.displayName, f"đã rời {group_name}", f"Nhóm còn {total_member} thành viên")
+
+def remember_verdict(message, verdict):
+    """Lưu kết quả của GPT vào cache, nhật ký huấn luyện và cho mô hình cục bộ học."""
+    verdict_cache.put(message, verdict)
+    verdict_log.append(message, verdict)
+    local_classifier.learn(message, verdict)
+
+@timed('gpt_call')
+def is_selling_context(message: str, timeout=None) -> bool:
+    """Dùng GPT để kiểm tra xem tin nhắn có nội dung buôn bán không, timeout tính bằng giây; None nếu lỗi.
+
+    Không tra cache: chỉ được gọi cho tin check_selling đã tra và trượt.
+    """
     try:
         response = openai.ChatCompletion.create(
             model="gpt-4",
@@ -122,137 +266,323 @@ def is_selling_context(message: str) -> bool:
             ],
             temperature=0,
             max_tokens=5,
+            request_timeout=timeout,
         )
         result = response.choices[0].message['content'].strip().lower()
-        return 'yes' in result
+        verdict = 'yes' in result
+        remember_verdict(message, verdict)
+        return verdict
     except Exception as e:
-        print(f"❌ Lỗi khi gọi GPT: {e}")
-        return False
-
+        log_event(moderation_log, 'gpt_failed', logging.WARNING, error=str(e))
+        return None
+
+@timed('gpt_batch')
+def is_selling_batch(messages, timeout=None):
+    """Hỏi GPT một lần cho cả lô tin nhắn, trả về list True/False/None theo thứ tự."""
+    # Mảng JSON thay cho danh sách đánh số: tin có xuống dòng hay tự chứa '2. "..."' không làm lệch thứ tự
+    payload = json.dumps(list(messages), ensure_ascii=False)
+    response = openai.ChatCompletion.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "Bạn là AI kiểm duyệt. Đầu vào là một mảng JSON các tin nhắn. Với mỗi tin nhắn, trả lời 'yes' nếu nội dung liên quan đến buôn bán, còn lại trả lời 'no'. Chỉ trả về một mảng JSON cùng số phần tử và đúng thứ tự, ví dụ [\"yes\", \"no\"]."},
+            {"role": "user", "content": payload}
+        ],
+        temperature=0,
+        max_tokens=6 * len(messages) + 10,
+        request_timeout=timeout,
+    )
+    verdicts = parse_verdicts(response.choices[0].message['content'], len(messages))
+    for message, verdict in zip(messages, verdicts):
+        if verdict is not None:
+            remember_verdict(message, verdict)
+    return verdicts
+
+selling_classifier = BatchClassifier(is_selling_batch, is_selling_context)
+
+@timed('moderation_verdict')
+def check_selling(message, timeout=None):
+    """Kiểm tra tin nhắn buôn bán: dùng cache kiểm duyệt, rồi mô hình cục bộ, chỉ tin chưa chắc chắn mới gom lô gửi GPT.
+
+    Trả về None nếu GPT quá hạn hoặc lỗi: không có kết quả, khác với "không buôn bán".
+    """
+    # Tin nhắn giống hoặc gần giống (chỉ khác số điện thoại, dấu câu...) dùng lại kết quả cũ
+    cached = verdict_cache.get(message)
+    if cached is not None:
+        return cached
+    with metrics.timer('local_classifier'):
+        verdict = local_classifier.decide(message)
+    if verdict is not None:
+        metrics.inc('local_decisions')
+        return verdict
+    return selling_classifier.classify(message, timeout)
+
+def send_welcome(bot, item, group_name, message_object, thread_id, thread_type):
+    """Gửi lời chào cho một thành viên mới: một thiệp chào mừng kèm lời chào và số thứ tự thành viên."""
+    member_info, number = item
+    messagesend = Message(text=f"🥳 Chào mừng {member_info.displayName} 🎉 đến với {group_name}! Bạn là thành viên thứ {number}.")
+    lines = welcome_card_lines(member_info, group_name, number)
+    send_card(bot, member_info.avatar, lines, messagesend, message_object, thread_id, thread_type)
+
+def send_welcome_many(bot, items, group_name, thread_id, thread_type):
+    """Gộp lời chào cho nhiều thành viên mới thành một tin nhắn."""
+    names = ', '.join(member_info.displayName for member_info, _ in items)
+    first, last = items[0][1], items[-1][1]
+    bot.send(Message(text=f"🥳 Chào mừng {names} 🎉 đến với {group_name} (thành viên #{first}–#{last})"), thread_id, thread_type)
+
+def send_goodbye(bot, member_info, group_name, total_member, message_object, thread_id, thread_type):
+    """Gửi lời tạm biệt cho một thành viên rời nhóm: một thiệp tạm biệt kèm lời nhắn."""
+    messagesend = Message(text=f"💔 Tạm biệt {member_info.displayName} 🤧 Chúc bạn may mắn 🤑!")
+    lines = goodbye_card_lines(member_info, group_name, total_member)
+    send_card(bot, member_info.avatar, lines, messagesend, message_object, thread_id, thread_type)
+
+def send_goodbye_many(bot, items, thread_id, thread_type):
+    """Gộp lời tạm biệt cho nhiều thành viên thành một tin nhắn."""
+    names = ', '.join(member_info.displayName for member_info in items)
+    bot.send(Message(text=f"💔 Tạm biệt {names} 🤧 Chúc các bạn may mắn 🤑!"), thread_id, thread_type)
+
+@timed('handle_group_member')
 def handle_group_member(bot, message_object, author_id, thread_id, thread_type):
-    """Xử lý sự kiện thành viên vào/ra nhóm."""
+    """Xử lý sự kiện thành viên vào/ra nhóm, trả về True nếu nhóm có thay đổi."""
     joined_members, left_members = check_member_changes(bot, thread_id)
+    if not joined_members and not left_members:
+        return False
+    log_event(welcome_log, 'members_changed', thread_id=thread_id, joined=joined_members, left=left_members)
+    metrics.inc('members_joined', len(joined_members))
+    metrics.inc('members_left', len(left_members))
+    profiles = profile_cache.resolve(bot, list(joined_members) + list(left_members))
+    group_name = bot.group_info_cache[thread_id]['name']
+    total_member = bot.group_info_cache[thread_id]['total_member']
 
-    # Chào đón thành viên mới
-    for member_id in joined_members:
-        member_info = bot.fetchUserInfo(member_id).changed_profiles[member_id]
-        total_member = bot.group_info_cache[thread_id]['total_member']
-        cover = member_info.avatar
+    # Vẽ thiệp ở nền và chỉ xếp tin vào hàng gửi khi thiệp xong (hoặc hết CARD_TIMEOUT) để luồng gửi
+    # không phải chờ; đợt đông người sẽ được gộp thành một tin chữ nên xếp hàng ngay, không cần vẽ
+    threshold = bot.send_scheduler.coalesce_threshold
 
-        try:
-            cover_response = requests.get(cover)
-            cover_filename = cover.rsplit('/', 1)[-1]
-            with open(cover_filename, 'wb') as f:
-                f.write(cover_response.content)
-        except Exception:
-            cover_filename = None
-
-        messagesend = Message(text=f"🥳 Chào mừng {member_info.displayName} 🎉 đến với {bot.group_info_cache[thread_id]['name']}")
-        if cover_filename and cover_response.status_code == 200:
-            bot.sendLocalImage(cover_filename, thread_id, thread_type, message=messagesend, width=240, height=240)
-            delete_file(cover_filename)
+    # Chào đón thành viên mới
+    for number, member_id in enumerate(joined_members, total_member - len(joined_members) + 1):
+        submit = partial(
+            bot.send_scheduler.submit_coalescing, thread_id, 'welcome', (profiles[member_id], number),
+            lambda item: send_welcome(bot, item, group_name, message_object, thread_id, thread_type),
+            lambda items: send_welcome_many(bot, items, group_name, thread_id, thread_type)
+        )
+        if len(joined_members) < threshold:
+            card_renderer.prefetch(thread_id, profiles[member_id].avatar,
+                                   welcome_card_lines(profiles[member_id], group_name, number), on_ready=submit)
         else:
-            bot.replyMessage(messagesend, message_object, thread_id, thread_type)
-
-        response = f"Chào mừng {member_info.displayName} đến với {bot.group_info_cache[thread_id]['name']}! Bạn là thành viên thứ {total_member}."
-        bot.send(Message(text=response), thread_id, thread_type)
+            submit()
 
     # Tạm biệt thành viên rời nhóm
     for member_id in left_members:
-        member_info = bot.fetchUserInfo(member_id).changed_profiles[member_id]
-        cover = member_info.avatar
-
-        try:
-            cover_response = requests.get(cover)
-            cover_filename = cover.rsplit('/', 1)[-1]
-            with open(cover_filename, 'wb') as f:
-                f.write(cover_response.content)
-        except Exception:
-            cover_filename = None
-
-        messagesend = Message(text=f"💔 Tạm biệt {member_info.displayName} 🤧")
-        if cover_filename and cover_response.status_code == 200:
-            bot.sendLocalImage(cover_filename, thread_id, thread_type, message=messagesend, width=240, height=240)
-            delete_file(cover_filename)
+        submit = partial(
+            bot.send_scheduler.submit_coalescing, thread_id, 'goodbye', profiles[member_id],
+            lambda member_info: send_goodbye(bot, member_info, group_name, total_member, message_object, thread_id, thread_type),
+            lambda items: send_goodbye_many(bot, items, thread_id, thread_type)
+        )
+        if len(left_members) < threshold:
+            card_renderer.prefetch(thread_id, profiles[member_id].avatar,
+                                   goodbye_card_lines(profiles[member_id], group_name, total_member), on_ready=submit)
         else:
-            bot.replyMessage(messagesend, message_object, thread_id, thread_type)
-
-        response = f"Tạm biệt {member_info.displayName}. Chúc bạn may mắn 🤑!"
-        bot.send(Message(text=response), thread_id, thread_type)
+            submit()
+    return True
 
 # Lớp Bot
 class Bot(ZaloAPI):
+    # Đo thời gian các lời gọi API Zalo; khi tắt số liệu đây chính là hàm gốc
+    fetchAllGroups = timed('api.fetchAllGroups')(ZaloAPI.fetchAllGroups)
+    fetchGroupInfo = timed('api.fetchGroupInfo')(ZaloAPI.fetchGroupInfo)
+    fetchUserInfo = timed('api.fetchUserInfo')(ZaloAPI.fetchUserInfo)
+    deleteGroupMsg = timed('api.deleteGroupMsg')(ZaloAPI.deleteGroupMsg)
+    send = timed('api.send')(ZaloAPI.send)
+    sendLocalImage = timed('api.sendLocalImage')(ZaloAPI.sendLocalImage)
+
     def __init__(self, api_key, secret_key, imei=None, session_cookies=None):
         super().__init__(api_key, secret_key, imei, session_cookies)
         self.group_info_cache = {}
+        self.warming_up = set()
+        # Khi chạy qua supervisor.py: chỉ xử lý các nhóm được chia, chờ supervisor gán trước khi làm gì
+        self.owned_groups = set() if SHARD_NAME else None
+        self.shard_assigned = False
+        self.send_scheduler = SendScheduler()
+        metrics.gauge('send_queue', self.send_scheduler.qsize)
+        self.moderation_pool = ModerationPool(check_selling, workers=MODERATION_WORKERS)
+        metrics.gauge('moderation_queue', self.moderation_pool.qsize)
         all_group = self.fetchAllGroups()
+        self.group_versions = dict(all_group.gridVerMap)
         allowed_thread_ids = list(all_group.gridVerMap.keys())
-        initialize_group_info(self, allowed_thread_ids)
+        initialize_group_info(self, restore_group_info(self, allowed_thread_ids))
+        if SAVE_MEMBER_SNAPSHOTS:
+            member_snapshots.start_autosave(self.group_info_cache)
         self.start_member_check_thread(allowed_thread_ids)
 
     def start_member_check_thread(self, allowed_thread_ids):
         """Bắt đầu luồng kiểm tra thay đổi thành viên."""
+        if MEMBER_CHECK_MODE == 'adaptive':
+            self.poll_scheduler = PollScheduler(self.poll_group, self.discover_groups, workers=POLL_WORKERS)
+            self.poll_scheduler.start(allowed_thread_ids)
+            return
+
         def check_members_loop():
             while True:
-                for thread_id in allowed_thread_ids:
-                    if is_welcome_enabled(thread_id):
-                        handle_group_member(self, None, None, thread_id, ThreadType.GROUP)
-                time.sleep(2)
+                with metrics.timer('member_sweep'):
+                    for thread_id in fetch_changed_groups(self):
+                        if thread_id in self.warming_up:
+                            # Chưa có snapshot: để lần sau kiểm tra lại
+                            self.group_versions.pop(thread_id, None)
+                            continue
+                        if self.owns(thread_id) and is_welcome_enabled(thread_id):
+                            try:
+                                handle_group_member(self, None, None, thread_id, ThreadType.GROUP)
+                            except Exception as e:
+                                # Bỏ mốc phiên bản để lần sau kiểm tra lại nhóm này, luồng vẫn chạy tiếp
+                                self.group_versions.pop(thread_id, None)
+                                log_event(welcome_log, 'member_check_failed', logging.WARNING,
+                                          thread_id=thread_id, error=str(e))
+                time.sleep(MEMBER_CHECK_INTERVAL)
 
         thread = threading.Thread(target=check_members_loop, daemon=True)
         thread.start()
 
-    def onMessage(self, mid, author_id, message, message_object, thread_id, thread_type):
-        """Xử lý tin nhắn đến, phát hiện liên kết và lệnh."""
-        print(f"🎏 {thread_type.name} {'🙂' if thread_type.name == 'USER' else '🐞'} {author_id} {thread_id}")
-        print(f"Nội dung tin nhắn: {message}")
-        print(f"Đối tượng tin nhắn: {message_object}")
-        print(f"cliMsgId: {getattr(message_object, 'cliMsgId', 'Không tìm thấy')}")
-
-        link_pattern = r'(https?:\/\/[^\s]+|www\.[^\s]+|(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,})'
-
-        # Xóa nếu content['title'] chứa liên kết
-        if hasattr(message_object, 'content') and isinstance(message_object.content, dict):
-            title = message_object.content.get('title', '')
-            if isinstance(title, str) and re.search(link_pattern, title.strip().lower()):
+    @timed('poll_group')
+    def poll_group(self, thread_id):
+        """Kiểm tra một nhóm cho PollScheduler, trả về True nếu có thành viên ra/vào."""
+        if thread_id in self.warming_up or not self.owns(thread_id) or not is_welcome_enabled(thread_id):
+            return False
+        return handle_group_member(self, None, None, thread_id, ThreadType.GROUP)
+
+    def discover_groups(self):
+        """Lấy danh sách toàn bộ nhóm hiện tại của tài khoản."""
+        return list(self.fetchAllGroups().gridVerMap.keys())
+
+    def owns(self, thread_id):
+        """Tài khoản này có phụ trách nhóm không (luôn đúng khi chạy một mình)."""
+        owned_groups = self.owned_groups
+        return owned_groups is None or thread_id in owned_groups
+
+    def set_owned_groups(self, thread_ids):
+        """Nhận tập nhóm được chia từ supervisor.
+
+        Nhóm nhận thêm sau lần chia đầu tiên được lấy lại mốc thành viên: snapshot của nó không được
+        cập nhật trong lúc tài khoản khác phụ trách nên so sánh với nó sẽ chào lại những người đã được chào.
+        """
+        thread_ids = set(thread_ids)
+        previous = self.owned_groups or set()
+        if self.shard_assigned:
+            for thread_id in thread_ids - previous:
+                self.group_info_cache.pop(thread_id, None)
+                self.group_versions.pop(thread_id, None)
+        self.owned_groups = thread_ids
+        self.shard_assigned = True
+        log_event(welcome_log, 'shard_assigned', shard=SHARD_NAME, groups=len(thread_ids),
+                  gained=len(thread_ids - previous), lost=len(previous - thread_ids))
+
+    def delete_selling_message(self, mid, author_id, cli_msg_id, thread_id, message, keyword=None, received=None,
+                               rule='selling', verdict=True):
+        """Xóa tin nhắn buôn bán, được gọi từ luồng kiểm duyệt (hoặc luồng gửi khi hàng đợi kiểm duyệt đầy)."""
+        decided = time.perf_counter()
+        try:
+            self.deleteGroupMsg(mid, author_id, cli_msg_id, thread_id)
+            log_event(moderation_log, 'selling_deleted', thread_id=thread_id, author_id=author_id, message=message)
+            metrics.inc('selling_deleted')
+            action = 'deleted'
+        except Exception as e:
+            log_event(moderation_log, 'selling_delete_failed', logging.WARNING, thread_id=thread_id,
+                      author_id=author_id, error=str(e))
+            action = 'delete_failed'
+        state_db.audit(thread_id, author_id, rule, action, message=message, detail=keyword, verdict=verdict,
+                       decision_ms=(decided - received) * 1000 if received else None,
+                       action_ms=(time.perf_counter() - decided) * 1000)
+
+    def delete_flood_messages(self, thread_id, author_id, refs):
+        """Xếp hàng xóa các tin của người spam trong một lượt, tính token theo số tin cần xóa."""
+        def delete_many(items):
+            started, failed = time.perf_counter(), 0
+            for mid, cli_msg_id in items:
                 try:
-                    self.deleteGroupMsg(mid, author_id, message_object.cliMsgId, thread_id)
-                    print(f"🚫 Đã xóa tin nhắn chứa liên kết trong content['title']: {title}")
-                    return
+                    self.deleteGroupMsg(mid, author_id, cli_msg_id, thread_id)
                 except Exception as e:
-                    print(f"❌ Lỗi khi xóa tin nhắn đối tượng: {e}")
-                    return
+                    failed += 1
+                    log_event(moderation_log, 'flood_delete_failed', logging.WARNING, thread_id=thread_id,
+                              author_id=author_id, mid=mid, error=str(e))
+            log_event(moderation_log, 'flood_deleted', thread_id=thread_id, author_id=author_id, count=len(items))
+            metrics.inc('flood_deleted', len(items))
+            state_db.audit(thread_id, author_id, 'flood', 'deleted' if not failed else 'delete_failed',
+                           detail=f'{len(items) - failed}/{len(items)} tin', action_ms=(time.perf_counter() - started) * 1000)
+
+        refs = list(refs)
+        self.send_scheduler.submit(thread_id, lambda: delete_many(refs), priority=PRIORITY_MODERATION, cost=len(refs))
+
+    @timed('on_message')
+    def onMessage(self, mid, author_id, message, message_object, thread_id, thread_type):
+        """Xử lý tin nhắn đến, phát hiện liên kết và lệnh."""
+        log_event(message_log, 'received', logging.DEBUG, thread_type=thread_type.name, thread_id=thread_id,
+                  author_id=author_id, cli_msg_id=getattr(message_object, 'cliMsgId', None), message=message,
+                  message_object=message_object)
+        received = time.perf_counter()
+        metrics.inc('messages')
+        if thread_type == ThreadType.GROUP and not self.owns(thread_id):
+            # Nhóm do tài khoản khác phụ trách
+            return
+
+        # Người gửi dồn dập: xóa hàng loạt, bỏ qua các bước kiểm tra liên kết/từ khóa/GPT
+        if thread_type == ThreadType.GROUP and not is_moderator(self, thread_id, author_id):
+            with metrics.timer('flood_check'):
+                flooded = flood_guard.record(thread_id, author_id, (mid, getattr(message_object, 'cliMsgId', None)))
+            if flooded:
+                self.delete_flood_messages(thread_id, author_id, flooded)
+                return
 
-        # Xóa nếu tin nhắn văn bản chứa liên kết
-        if isinstance(message, str) and re.search(link_pattern, message.strip().lower()):
+        # Xóa nếu content['title'] hoặc tin nhắn văn bản chứa liên kết
+        content = getattr(message_object, 'content', None)
+        title = content.get('title') if isinstance(content, dict) else None
+        with metrics.timer('link_scan'):
+            link = link_scanner.find(title, message)
+        if link:
+            decided = time.perf_counter()
             try:
                 self.deleteGroupMsg(mid, author_id, message_object.cliMsgId, thread_id)
-                print(f"🚫 Đã xóa tin nhắn chứa liên kết từ {author_id}: {message}")
-                return
+                log_event(moderation_log, 'link_deleted', thread_id=thread_id, author_id=author_id, link=link)
+                metrics.inc('links_deleted')
+                action = 'deleted'
             except Exception as e:
-                print(f"❌ Lỗi khi xóa liên kết: {e}")
-                return
+                log_event(moderation_log, 'link_delete_failed', logging.WARNING, thread_id=thread_id,
+                          author_id=author_id, link=link, error=str(e))
+                action = 'delete_failed'
+            state_db.audit(thread_id, author_id, 'link', action, message=message, detail=link,
+                           decision_ms=(decided - received) * 1000, action_ms=(time.perf_counter() - decided) * 1000)
+            return
 
         # Phân tích AI: Xóa nếu tin nhắn liên quan đến buôn bán
         if isinstance(message, str):
-            ban_keywords = [
-                "bán", "shop", "giá", "đặt hàng", "giao hàng", "order", "sale", "ship",
-                "khuyến mãi", "mua", "sỉ lẻ", "bao giá", "chốt đơn", "thanh toán",
-                "săn sale", "combo", "freeship", "deal", "đơn hàng", "tuyển sỉ", "tuyển ctv"
-            ]
-            lowered = message.lower()
-            if any(kw in lowered for kw in ban_keywords):
-                print("🤖 Phát hiện từ khóa nghi ngờ buôn bán, gọi GPT để kiểm tra...")
-                if is_selling_context(message):
-                    try:
-                        self.deleteGroupMsg(mid, author_id, message_object.cliMsgId, thread_id)
-                        print(f"🛒 Đã xóa tin nhắn buôn bán: {message}")
-                        return
-                    except Exception as e:
-                        print(f"❌ Lỗi khi xóa tin nhắn buôn bán: {e}")
-                        return
-                else:
-                    print("✅ GPT xác nhận không phải tin nhắn buôn bán, giữ lại.")
+            with metrics.timer('keyword_scan'):
+                keyword = keyword_filter.match(thread_id, message)
+            if keyword:
+                log_event(moderation_log, 'keyword_suspect', thread_id=thread_id, author_id=author_id, keyword=keyword)
+                cli_msg_id = message_object.cliMsgId
+
+                def on_verdict(is_selling, reason=None):
+                    if is_selling:
+                        self.delete_selling_message(mid, author_id, cli_msg_id, thread_id, message, keyword, received)
+                    elif is_selling is None:
+                        # Không có kết quả (quá hạn/lỗi): giữ tin nhắn nhưng không ghi như GPT đã nói "không"
+                        log_event(moderation_log, f'selling_{reason}', logging.WARNING, thread_id=thread_id,
+                                  author_id=author_id, keyword=keyword)
+                        state_db.audit(thread_id, author_id, 'selling', reason, message=message, detail=keyword,
+                                       decision_ms=(time.perf_counter() - received) * 1000)
+                    else:
+                        log_event(moderation_log, 'selling_kept', thread_id=thread_id, author_id=author_id, keyword=keyword)
+                        state_db.audit(thread_id, author_id, 'selling', 'kept', message=message, detail=keyword,
+                                       verdict=False, decision_ms=(time.perf_counter() - received) * 1000)
+
+                if not self.moderation_pool.submit(message, on_verdict):
+                    # Hàng đợi đầy: xóa theo từ khóa, lệnh xóa đi qua hàng đợi gửi để không chặn luồng listener
+                    log_event(moderation_log, 'queue_full_keyword_delete', logging.WARNING, thread_id=thread_id,
+                              author_id=author_id, keyword=keyword)
+                    self.send_scheduler.submit(
+                        thread_id,
+                        lambda: self.delete_selling_message(mid, author_id, cli_msg_id, thread_id, message, keyword,
+                                                            received, rule='keyword', verdict=None),
+                        priority=PRIORITY_MODERATION
+                    )
+                    return
 
         # Xử lý lệnh !wl
         if isinstance(message, str) and message.startswith('!wl'):
@@ -261,7 +591,7 @@ class Bot(ZaloAPI):
                 response = "➜ Vui lòng chỉ định [on/off] sau !wl 🤗\n➜ Ví dụ: !wl on hoặc !wl off ✅"
             else:
                 sub_action = parts[1].lower()
-                if author_id not in [self.uid, '2049100404891878006']:
+                if author_id not in [self.uid, OWNER_ID]:
                     response = "➜ Lệnh này chỉ dành cho chủ sở hữu 🤗"
                 elif thread_type != ThreadType.GROUP:
                     response = "➜ Lệnh này chỉ hoạt động trong nhóm 🤗"
@@ -272,7 +602,7 @@ class Bot(ZaloAPI):
                         f"➜ Lệnh !wl {sub_action} không được hỗ trợ 🤗"
                     )
             if response:
-                self.send(Message(text=response), thread_id, thread_type)
+                self.send_scheduler.submit(thread_id, lambda: self.send(Message(text=response), thread_id, thread_type))
 
 # Cấu hình
 imei = 'df654c2f-a935-410b-b9b4-c111cf98cbce-7ddeda88d0c599cc494da0dece6554d5'
@@ -289,5 +619,8 @@ session_cookies = {
 }
 
 # Chạy bot
-client = Bot('api_key', 'secret_key', imei=imei, session_cookies=session_cookies)
-client.listen(run_forever=True, delay=0, thread=True, type='requests')
+if __name__ == '__main__':
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    client = Bot('api_key', 'secret_key', imei=imei, session_cookies=session_cookies)
+    client.listen(run_forever=True, delay=0, thread=True, type='requests')
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from keyword_filter import normalize
+from persistence import atomic_write, start_autosave
+
+# Constants
+VERDICT_TTL = 24 * 60 * 60  # Giữ kết quả kiểm duyệt trong 1 ngày
+VERDICT_MAX_ENTRIES = 50000
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4  # 4 dải 16 bit: hai bản sai khác <= 3 bit chắc chắn trùng ít nhất một dải
+SIMHASH_MAX_DISTANCE = 3
+
+_DIGITS = re.compile(r'\d+')
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def canonical(text):
+    """Dạng chuẩn của tin nhắn: bỏ dấu, viết thường, bỏ dấu câu, thay mọi dãy số bằng '0'."""
+    text = normalize(text, strip_tones=True)
+    text = _DIGITS.sub('0', text)
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def simhash(text, ngram=3):
+    """SimHash 64 bit trên các n-gram ký tự."""
+    if len(text) < ngram:
+        shingles = [text]
+    else:
+        shingles = {text[i:i + ngram] for i in range(len(text) - ngram + 1)}
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def _bands(value):
+    """Tách simhash thành các dải dùng làm khóa chỉ mục."""
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    return [(i, value >> (i * width) & mask) for i in range(SIMHASH_BANDS)]
+
+
+class VerdictCache:
+    """Cache kết quả kiểm duyệt theo dấu vân tay tin nhắn, có LRU, TTL và dò bản gần trùng bằng SimHash."""
+
+    def __init__(self, ttl=VERDICT_TTL, max_entries=VERDICT_MAX_ENTRIES, path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()  # khóa -> (thời điểm hết hạn, kết quả, simhash)
+        self._bands = {}  # (dải, giá trị) -> tập khóa
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._peer_mtimes = {}  # file cache của tiến trình khác -> mtime lần nạp trước
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+
+    # Truy vấn
+    def get(self, text):
+        """Trả về kết quả đã lưu cho tin nhắn giống hoặc gần giống, None nếu chưa có."""
+        text = canonical(text)
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        value = simhash(text)
+        with self._lock:
+            for near_key in self._candidates(value):
+                entry = self._entries.get(near_key)
+                if entry and entry[0] > now and bin(entry[2] ^ value).count('1') <= SIMHASH_MAX_DISTANCE:
+                    self._entries.move_to_end(near_key)
+                    self.near_hits += 1
+                    return entry[1]
+            self.misses += 1
+        return None
+
+    def _candidates(self, value):
+        """Các khóa có ít nhất một dải simhash trùng với value."""
+        keys = set()
+        for band in _bands(value):
+            keys.update(self._bands.get(band, ()))
+        return keys
+
+    def stats(self):
+        """Số lần trúng/trượt của cache."""
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0
+            }
+
+    # Ghi
+    def put(self, text, verdict):
+        """Lưu kết quả kiểm duyệt cho tin nhắn."""
+        text = canonical(text)
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        self._insert(key, time.time() + self.ttl, verdict, simhash(text))
+
+    def _insert(self, key, expires, verdict, value, own=True):
+        """Thêm mục vào LRU và chỉ mục simhash, loại mục cũ nhất khi đầy.
+
+        own=False cho mục nạp từ cache của tiến trình khác: không ghi đè mục mới hơn và không cần lưu lại.
+        """
+        with self._lock:
+            if not own:
+                current = self._entries.get(key)
+                if current and current[0] >= expires:
+                    return
+            self._remove(key)
+            self._entries[key] = (expires, verdict, value)
+            for band in _bands(value):
+                self._bands.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            if own:
+                self._dirty = True
+
+    def _remove(self, key):
+        """Xóa mục khỏi LRU và chỉ mục simhash."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in _bands(entry[2]):
+            keys = self._bands.get(band)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+
+    # Lưu xuống đĩa
+    def load(self, path=None):
+        """Nạp các kết quả còn hạn từ file JSON lines (mặc định là file của chính cache)."""
+        own = path is None or path == self.path
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return
+        now = time.time()
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        key, expires, verdict, value = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    if expires > now:
+                        self._insert(key, expires, verdict, value, own=own)
+        except OSError as e:
+            print(f"Lỗi khi đọc cache kiểm duyệt: {e}")
+        if own:
+            self._dirty = False
+
+    def merge_from(self, paths):
+        """Nạp thêm kết quả từ file cache của các tiến trình khác, bỏ qua file chưa thay đổi."""
+        for path in paths:
+            if path == self.path:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if self._peer_mtimes.get(path) != mtime:
+                self._peer_mtimes[path] = mtime
+                self.load(path)
+
+    def save(self):
+        """Ghi các kết quả còn hạn ra file tạm rồi rename."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            rows = [(key, *entry) for key, entry in self._entries.items() if entry[0] > now]
+            self._dirty = False
+        try:
+            with atomic_write(self.path, 'w', prefix='.verdicts-', encoding='utf-8') as file:
+                for row in rows:
+                    file.write(json.dumps(row) + '\n')
+        except OSError as e:
+            print(f"Lỗi khi ghi cache kiểm duyệt: {e}")
+
+    def start_autosave(self, interval=60):
+        """Định kỳ lưu cache xuống đĩa và lưu lần cuối khi thoát."""
+        start_autosave(self.save, interval, 'verdict-autosave')
@@ -0,0 +1,50 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def _load_with_retry(load_group, thread_id, retries, backoff):
+    """Gọi load_group(thread_id), thử lại với thời gian chờ tăng dần khi lỗi."""
+    for attempt in range(retries + 1):
+        try:
+            load_group(thread_id)
+            return True
+        except Exception as e:
+            if attempt == retries:
+                print(f"❌ Lỗi khi khởi tạo nhóm {thread_id}: {e}")
+                return False
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+    return False
+
+
+def warm_up(thread_ids, load_group, workers=8, retries=2, backoff=0.5, progress_every=25):
+    """Khởi tạo danh sách nhóm song song với số luồng giới hạn, trả về (thành công, thất bại)."""
+    thread_ids = list(thread_ids)
+    total = len(thread_ids)
+    loaded, failed = [], []
+    if not total:
+        return loaded, failed
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='warmup') as pool:
+        futures = {pool.submit(_load_with_retry, load_group, thread_id, retries, backoff): thread_id
+                   for thread_id in thread_ids}
+        for done, future in enumerate(as_completed(futures), 1):
+            thread_id = futures[future]
+            (loaded if future.result() else failed).append(thread_id)
+            if done % progress_every == 0 or done == total:
+                print(f"⏳ Khởi tạo nhóm: {done}/{total} ({len(failed)} lỗi, {time.monotonic() - started:.1f}s)")
+    return loaded, failed
+
+
+def start_warm_up(thread_ids, load_group, on_finish=None, **kwargs):
+    """Chạy warm_up trong luồng nền để listener có thể bắt đầu ngay."""
+    def run():
+        loaded, failed = warm_up(thread_ids, load_group, **kwargs)
+        if on_finish:
+            on_finish(loaded, failed)
+
+    thread = threading.Thread(target=run, name='warmup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,283 @@
+"""Vẽ thiệp chào mừng/tạm biệt (ảnh đại diện thu nhỏ, tên, tên nhóm, số thành viên) thành một ảnh nhỏ gửi trong một tin.
+
+Mẫu thiệp theo nhóm trong mục "cards" của bảng settings (bot.db), nhóm không có mẫu riêng dùng "default":
+
+    "cards": {
+        "default": {"background": "#1f2937", "color": "#ffffff", "accent": "#60a5fa", "font": "DejaVuSans.ttf"},
+        "<thread_id>": {"background": "nen_nhom.png"}
+    }
+
+Không cài Pillow thì CardRenderer.enabled là False và bot gửi ảnh đại diện như trước.
+"""
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from avatar_cache import ImageCache
+
+try:
+    from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageOps
+except ImportError:
+    Image = None
+
+# Constants
+CARD_WIDTH = 480
+CARD_HEIGHT = 240
+AVATAR_SIZE = 160
+CARD_QUALITY = 85
+CARD_WORKERS = 2  # Số tiến trình vẽ thiệp
+CARD_TIMEOUT = 10  # Giây chờ tối đa một thiệp trước khi gửi ảnh đại diện thay thế
+CARD_CACHE_BYTES = 8 * 1024 * 1024  # Thiệp ~15-25 KB: giữ được vài trăm thiệp gần nhất
+DEFAULT_TEMPLATE = {'background': '#1f2937', 'color': '#ffffff', 'accent': '#60a5fa', 'font': 'DejaVuSans.ttf'}
+FONT_FALLBACKS = ('DejaVuSans.ttf', 'Arial.ttf', 'arial.ttf')
+
+# Nền, font và mặt nạ tròn được nạp một lần trong mỗi tiến trình vẽ rồi dùng lại
+_backgrounds = {}
+_fonts = {}
+_masks = {}
+
+
+def _color(value, default):
+    try:
+        return ImageColor.getrgb(value)
+    except (ValueError, AttributeError):
+        return ImageColor.getrgb(default)
+
+
+def _font(name, size):
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        for candidate in (name,) + FONT_FALLBACKS:
+            try:
+                font = ImageFont.truetype(candidate, size)
+                break
+            except (OSError, TypeError, ValueError):
+                continue
+        else:
+            try:
+                font = ImageFont.load_default(size)
+            except TypeError:
+                font = ImageFont.load_default()
+        _fonts[key] = font
+    return font
+
+
+def _background(spec):
+    """Ảnh nền đúng kích thước thiệp từ đường dẫn ảnh hoặc mã màu."""
+    background = _backgrounds.get(spec)
+    if background is None:
+        if spec and os.path.isfile(spec):
+            with Image.open(spec) as image:
+                background = ImageOps.fit(image.convert('RGB'), (CARD_WIDTH, CARD_HEIGHT), Image.LANCZOS)
+        else:
+            background = Image.new('RGB', (CARD_WIDTH, CARD_HEIGHT), _color(spec, DEFAULT_TEMPLATE['background']))
+        _backgrounds[spec] = background
+    return background
+
+
+def _circle_mask(size):
+    """Mặt nạ tròn khử răng cưa: vẽ ở 4 lần kích thước rồi thu nhỏ."""
+    mask = _masks.get(size)
+    if mask is None:
+        large = Image.new('L', (size * 4, size * 4), 0)
+        ImageDraw.Draw(large).ellipse((0, 0, size * 4 - 1, size * 4 - 1), fill=255)
+        mask = _masks[size] = large.resize((size, size), Image.LANCZOS)
+    return mask
+
+
+def _avatar(data, size):
+    """Giải mã và thu nhỏ ảnh đại diện; JPEG được giải mã thẳng ở độ phân giải thấp bằng draft()."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', (size, size))
+        return ImageOps.fit(image.convert('RGB'), (size, size), Image.LANCZOS)
+
+
+def _fit_text(draw, text, font_name, size, max_width, min_size=14):
+    """Font lớn nhất (không nhỏ hơn min_size) vừa max_width, cắt bớt chữ nếu vẫn quá dài."""
+    while True:
+        font = _font(font_name, size)
+        if draw.textlength(text, font=font) <= max_width or size <= min_size:
+            break
+        size -= 2
+    while len(text) > 1 and draw.textlength(text, font=font) > max_width:
+        text = text[:-2].rstrip() + '…'
+    return text, font
+
+
+def render_card(template, lines, avatar_data=None):
+    """Vẽ thiệp, trả về nội dung JPEG. lines = (dòng tên, dòng nhóm, dòng số thành viên)."""
+    card = _background(template.get('background')).copy()
+    draw = ImageDraw.Draw(card)
+    color = _color(template.get('color'), DEFAULT_TEMPLATE['color'])
+    accent = _color(template.get('accent'), DEFAULT_TEMPLATE['accent'])
+    font_name = template.get('font') or DEFAULT_TEMPLATE['font']
+
+    top = (CARD_HEIGHT - AVATAR_SIZE) // 2
+    avatar = None
+    if avatar_data:
+        try:
+            avatar = _avatar(avatar_data, AVATAR_SIZE)
+        except Exception:
+            avatar = None
+    if avatar is None:
+        # Không có ảnh đại diện: vòng tròn màu nhấn với chữ cái đầu của tên
+        avatar = Image.new('RGB', (AVATAR_SIZE, AVATAR_SIZE), accent)
+        initial = (lines[0].strip()[:1] or '?').upper()
+        ImageDraw.Draw(avatar).text((AVATAR_SIZE // 2, AVATAR_SIZE // 2), initial, fill=color,
+                                    font=_font(font_name, AVATAR_SIZE // 2), anchor='mm')
+    draw.ellipse((top - 4, top - 4, top + AVATAR_SIZE + 3, top + AVATAR_SIZE + 3), fill=accent)
+    card.paste(avatar, (top, top), _circle_mask(AVATAR_SIZE))
+
+    left = top + AVATAR_SIZE + 24
+    max_width = CARD_WIDTH - left - 16
+    title, subtitle, footer = (list(lines) + ['', '', ''])[:3]
+    text, font = _fit_text(draw, title, font_name, 30, max_width)
+    draw.text((left, 62), text, fill=color, font=font)
+    text, font = _fit_text(draw, subtitle, font_name, 20, max_width)
+    draw.text((left, 110), text, fill=color, font=font)
+    text, font = _fit_text(draw, footer, font_name, 22, max_width)
+    draw.text((left, 148), text, fill=accent, font=font)
+
+    output = io.BytesIO()
+    card.save(output, 'JPEG', quality=CARD_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def _watch_parent(parent_pid):
+    """Tiến trình vẽ tự thoát khi bot chết đột ngột (kill -9, os._exit) thay vì treo mãi."""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watch, name='card-parent-watch', daemon=True).start()
+
+
+def _warm_up(template):
+    """Nạp sẵn nền và font mặc định trong tiến trình vẽ."""
+    render_card(template, ('', '', ''))
+
+
+def _make_pool(workers):
+    """Nhóm tiến trình vẽ thiệp.
+
+    Trên Linux các tiến trình được fork ngay khi tạo (lúc import script, trước khi bot chạy luồng nền)
+    để không phải import lại script bot trong tiến trình con. Nơi không fork an toàn được (Windows,
+    macOS) dùng nhóm luồng: phần lớn việc giải mã/thu nhỏ/nén JPEG của Pillow nhả GIL.
+    """
+    if sys.platform.startswith('linux'):
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=_watch_parent, initargs=(os.getpid(),))
+        pool.submit(_warm_up, DEFAULT_TEMPLATE).result()
+        return pool
+    return ThreadPoolExecutor(workers, thread_name_prefix='card-render')
+
+
+def _when_done(future, callback, timeout):
+    """Gọi callback() đúng một lần: khi future xong hoặc sau timeout giây, tùy điều nào đến trước."""
+    fired = threading.Lock()
+
+    def fire(_=None):
+        if fired.acquire(blocking=False):
+            timer.cancel()
+            callback()
+
+    timer = threading.Timer(timeout, fire)
+    timer.daemon = True
+    timer.start()
+    future.add_done_callback(fire)
+
+
+class CardRenderer:
+    """Vẽ thiệp ở nhóm tiến trình riêng và giữ các thiệp đã vẽ trong ImageCache của avatar_cache.
+
+    prefetch() bắt đầu tải ảnh đại diện và vẽ ngay khi phát hiện thành viên mới rồi báo on_ready khi
+    thiệp xong (hoặc hết timeout), staged() ở luồng gửi chỉ lấy thiệp trong cache, không bao giờ chờ vẽ.
+    store có thể gán sau khi tạo (None thì dùng mẫu mặc định) để nhóm tiến trình được fork trước mọi luồng nền.
+    """
+
+    def __init__(self, store, avatars, workers=CARD_WORKERS, max_bytes=CARD_CACHE_BYTES, timeout=CARD_TIMEOUT):
+        self.store = store
+        self.avatars = avatars
+        self.timeout = timeout
+        self.enabled = Image is not None and workers > 0
+        self.cards = ImageCache(max_bytes, staging_prefix='zalo-card-')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        # Luồng của ThreadPoolExecutor chỉ được tạo khi có việc nên vẫn an toàn trước khi fork
+        self._fetcher = ThreadPoolExecutor(max(workers, 1) * 2, thread_name_prefix='card-avatar')
+        if self.enabled:
+            try:
+                self._pool = _make_pool(workers)
+            except Exception as e:
+                print(f"Không tạo được nhóm tiến trình vẽ thiệp: {e}")
+                self.enabled = False
+
+    def template(self, thread_id):
+        """Mẫu thiệp của nhóm: mặc định, ghi đè bởi "default" rồi bởi mẫu riêng của nhóm."""
+        template = dict(DEFAULT_TEMPLATE)
+        if self.store is not None:
+            template.update(self.store.get('cards', 'default') or {})
+            template.update(self.store.get('cards', thread_id) or {})
+        return template
+
+    def prefetch(self, thread_id, avatar_url, lines, on_ready=None):
+        """Bắt đầu vẽ thiệp ở nền (chỉ tải ảnh đại diện nếu không vẽ được thiệp) và trả về ngay.
+
+        on_ready() được gọi đúng một lần khi xong hoặc sau timeout giây, từ luồng nền.
+        """
+        if self.enabled:
+            future = self._submit(thread_id, avatar_url, lines)
+        else:
+            future = self._fetcher.submit(self.avatars.get, avatar_url)
+        if on_ready is not None:
+            _when_done(future, on_ready, self.timeout)
+
+    def cached(self, thread_id, avatar_url, lines):
+        """Nội dung JPEG của thiệp nếu đã vẽ xong, None nếu chưa có (không chờ vẽ)."""
+        if not self.enabled:
+            return None
+        return self.cards.peek(self._key(thread_id, avatar_url, lines)[0])
+
+    def _key(self, thread_id, avatar_url, lines):
+        """Khóa cache của thiệp và mẫu dùng để vẽ."""
+        template = self.template(thread_id)
+        return (avatar_url, tuple(lines), json.dumps(template, sort_keys=True)), template
+
+    def _submit(self, thread_id, avatar_url, lines):
+        key, template = self._key(thread_id, avatar_url, lines)
+        lines = key[1]
+        data = self.cards.peek(key)
+        if data is not None:
+            future = Future()
+            future.set_result(data)
+            return future
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = self._fetcher.submit(self._render, key, template, avatar_url, lines)
+            return future
+
+    def _render(self, key, template, avatar_url, lines):
+        """Tải ảnh đại diện (qua avatar_cache) rồi gửi sang tiến trình vẽ."""
+        try:
+            data = self._pool.submit(render_card, template, lines, self.avatars.get(avatar_url)).result()
+            self.cards.put(key, data)
+            return data
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def staged(self, thread_id, avatar_url, lines):
+        """Ghi thiệp đã vẽ ra một file tạm có tên duy nhất, xóa file khi ra khỏi khối with.
+
+        Trả về None nếu thiệp chưa được vẽ xong.
+        """
+        return self.cards.staged_data(self.cached(thread_id, avatar_url, lines))